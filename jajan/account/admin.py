@@ -8,4 +8,5 @@ class AccountAdmin(admin.ModelAdmin):
         return '{} (id={})'.format(obj.user.username, obj.user.id)
 
     list_display = ('id', user, 'name', 'card_number')
+    list_select_related = ('user',)
 
@@ -1,7 +1,62 @@
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connection
+from django.utils.functional import cached_property
 
+from jajan.account.models import Account
+
+from . import search
 from .models import Transaction
 
+class EstimatedCountPaginator(Paginator):
+    """Paginator that estimates the size of unfiltered large tables.
+
+    COUNT(*) reads the whole table, on PostgreSQL the planner's row estimate
+    is used instead and on SQLite the largest id. Filtered lists and tables
+    below `threshold` rows are counted exactly.
+    """
+
+    threshold = 100000
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is not None and not query.where:
+            estimate = self._estimate(self.object_list.model)
+            if estimate is not None and estimate > self.threshold:
+                return estimate
+        return super().count
+
+    def _estimate(self, model):
+        table = model._meta.db_table
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE relname = %s', [table])
+            elif connection.vendor == 'sqlite':
+                cursor.execute('SELECT MAX({}) FROM {}'.format(
+                    connection.ops.quote_name(model._meta.pk.column), connection.ops.quote_name(table)))
+            else:
+                return None
+            row = cursor.fetchone()
+        if row is None or row[0] is None or row[0] < 0:
+            return None
+        return int(row[0])
+
+class AccountListFilter(admin.SimpleListFilter):
+    """Filter by account, listing them with their users in one query."""
+
+    title = 'account'
+    parameter_name = 'account'
+
+    def lookups(self, request, model_admin):
+        accounts = Account.objects.select_related('user').order_by('user__username', 'name')
+        return [(str(a.pk), str(a)) for a in accounts]
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(account_id=self.value())
+        return queryset
+
 @admin.register(Transaction)
 class TransactionAdmin(admin.ModelAdmin):
     def user(obj):
@@ -14,4 +69,21 @@ class TransactionAdmin(admin.ModelAdmin):
         return obj.account.card_number
 
     list_display = ('id', 'timestamp', user, account, card_number, 'transaction_id', 'category', 'amount')
+    list_select_related = ('account', 'account__user')
+    list_filter = (AccountListFilter, 'category')
+    date_hierarchy = 'timestamp'
+    ordering = ('-timestamp', '-id')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    raw_id_fields = ('account',)
+    search_fields = ('transaction_id', 'description', 'note', 'reference')
+    search_help_text = 'A transaction id, or words starting the words of a description, note or reference.'
 
+    def get_search_results(self, request, queryset, search_term):
+        # only lookups that can use an index, no LIKE '%term%'
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        if term.isdigit():
+            return queryset.filter(transaction_id=term) | search.matching(queryset, term), False
+        return search.matching(queryset, term), False
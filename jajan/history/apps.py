@@ -1,5 +1,10 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class HistoryConfig(AppConfig):
     name = 'jajan.history'
+
+    def ready(self):
+        from .bulkload import set_sqlite_pragmas
+        connection_created.connect(set_sqlite_pragmas, dispatch_uid='history.sqlite_pragmas')
@@ -0,0 +1,185 @@
+"""Backends writing imported transactions to the database.
+
+A loader inserts new Transaction instances and updates the category of
+existing ones. ORMLoader uses bulk_create and bulk_update and works on every
+database. SQLiteLoader and PostgresLoader bypass the ORM: SQLite gets one
+executemany per batch, PostgreSQL streams the rows with COPY into a
+temporary table and merges it into the transactions table. The merge skips
+transactions that are already stored, e.g. by a concurrent import of the
+same statement, the other loaders fail on them. load returns the
+transactions it inserted, so that the importer only counts those in the
+summaries.
+
+Loaders must be used inside a database transaction.
+"""
+
+import io
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, models
+
+from jajan.history.models import Transaction
+
+class ORMLoader(object):
+    name = 'orm'
+
+    def __init__(self, connection, batch_size=500):
+        self.connection = connection
+        self.batch_size = batch_size
+
+    def load(self, new, changed):
+        """Inserts the `new` transactions and saves the category of `changed` ones.
+
+        Returns the transactions of `new` that were inserted.
+        """
+        Transaction.objects.using(self.connection.alias).bulk_create(new, batch_size=self.batch_size)
+        if changed:
+            Transaction.objects.using(self.connection.alias).bulk_update(
+                changed, ['category'], batch_size=self.batch_size)
+        return new
+
+class _NativeLoader(ORMLoader):
+    def __init__(self, connection, batch_size=5000):
+        ORMLoader.__init__(self, connection, batch_size=batch_size)
+        meta = Transaction._meta
+        self.table = meta.db_table
+        self.fields = [f for f in meta.concrete_fields if not f.primary_key]
+        self.columns = [f.column for f in self.fields]
+        self.pk_column = meta.pk.column
+        self.category_column = meta.get_field('category').column
+        self.account_column = meta.get_field('account').column
+        self.id_column = meta.get_field('transaction_id').column
+
+    def q(self, name):
+        return self.connection.ops.quote_name(name)
+
+    def rows(self, transactions):
+        # prepared the same way the ORM would, e.g. datetimes in UTC for
+        # SQLite. Strings and foreign keys are passed as they are, the
+        # field methods only cost time for those.
+        connection = self.connection
+        prepare = []
+        for f in self.fields:
+            if isinstance(f, (models.CharField, models.ForeignKey)):
+                prepare.append((f.attname, None))
+            else:
+                prepare.append((f.attname, f.get_db_prep_save))
+
+        for tx in transactions:
+            yield tuple(getattr(tx, attname) if prep is None else prep(getattr(tx, attname), connection)
+                        for attname, prep in prepare)
+
+    def _insert_sql(self, source):
+        return 'INSERT INTO {table} ({columns}) {source}'.format(
+            table=self.q(self.table),
+            columns=', '.join(self.q(c) for c in self.columns),
+            source=source)
+
+    def update_categories(self, cursor, changed):
+        sql = 'UPDATE {} SET {} = %s WHERE {} = %s'.format(
+            self.q(self.table), self.q(self.category_column), self.q(self.pk_column))
+        cursor.executemany(sql, [(tx.category, tx.pk) for tx in changed])
+
+class SQLiteLoader(_NativeLoader):
+    name = 'sqlite'
+
+    def load(self, new, changed):
+        values = 'VALUES ({})'.format(', '.join(['%s'] * len(self.columns)))
+        sql = self._insert_sql(values)
+        with self.connection.cursor() as cursor:
+            rows = self.rows(new)
+            while True:
+                batch = [row for _, row in zip(range(self.batch_size), rows)]
+                if not batch:
+                    break
+                cursor.executemany(sql, batch)
+            if changed:
+                self.update_categories(cursor, changed)
+        return new
+
+class PostgresLoader(_NativeLoader):
+    name = 'postgresql'
+    staging = 'history_transaction_staging'
+
+    def load(self, new, changed):
+        columns = ', '.join(self.q(c) for c in self.columns)
+        inserted = []
+        with self.connection.cursor() as cursor:
+            if new:
+                # no constraints on the staging table, the merge checks them
+                cursor.execute('CREATE TEMPORARY TABLE {} ON COMMIT DROP AS SELECT {} FROM {} WITH NO DATA'.format(
+                    self.q(self.staging), columns, self.q(self.table)))
+                self._copy(cursor.cursor, 'COPY {} ({}) FROM STDIN'.format(self.q(self.staging), columns),
+                           self.rows(new))
+                # waits for a concurrent import of the same transactions to
+                # finish and leaves out the ones it stored
+                cursor.execute(self._insert_sql(
+                    'SELECT {} FROM {} ON CONFLICT ({}, {}) DO NOTHING RETURNING {}'.format(
+                        columns, self.q(self.staging), self.q(self.account_column),
+                        self.q(self.id_column), self.q(self.id_column))))
+                ids = set(tid for tid, in cursor.fetchall())
+                inserted = [tx for tx in new if tx.transaction_id in ids]
+                cursor.execute('DROP TABLE {}'.format(self.q(self.staging)))
+            if changed:
+                self.update_categories(cursor, changed)
+        return inserted
+
+    def _copy(self, cursor, sql, rows):
+        if hasattr(cursor, 'copy'):
+            # psycopg 3
+            with cursor.copy(sql) as copy:
+                for row in rows:
+                    copy.write_row(row)
+            return
+
+        # psycopg2 only takes a file, send it one batch at a time
+        while True:
+            buf = io.StringIO()
+            for _, row in zip(range(self.batch_size), rows):
+                buf.write('\t'.join(_copy_text(value) for value in row))
+                buf.write('\n')
+            if not buf.tell():
+                break
+            buf.seek(0)
+            cursor.copy_expert(sql, buf)
+
+_copy_escapes = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+def _copy_text(value):
+    if value is None:
+        return '\\N'
+    return str(value).translate(_copy_escapes)
+
+_loaders = {
+    'sqlite': SQLiteLoader,
+    'postgresql': PostgresLoader,
+}
+
+def get_loader(connection=None, name=None):
+    """Returns the loader for `connection`.
+
+    `name` is 'native' or 'orm', by default the HISTORY_BULK_LOADER setting.
+    'native' falls back to the ORM on databases without a native loader.
+    """
+    if connection is None:
+        # the wrapper itself, django.db.connection looks it up on every access
+        connection = connections[DEFAULT_DB_ALIAS]
+    if name is None:
+        name = getattr(settings, 'HISTORY_BULK_LOADER', 'native')
+    if name not in ('native', 'orm'):
+        raise ValueError('unknown bulk loader {!r}'.format(name))
+
+    if name == 'native' and connection.vendor in _loaders:
+        return _loaders[connection.vendor](connection)
+    return ORMLoader(connection)
+
+def set_sqlite_pragmas(sender, connection, **kwargs):
+    """connection_created receiver applying the SQLITE_PRAGMAS setting."""
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', {})
+    if not pragmas:
+        return
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute('PRAGMA {} = {}'.format(name, value))
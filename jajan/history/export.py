@@ -0,0 +1,131 @@
+"""Serialization of transactions for the list API and the exports.
+
+Exports read the transactions with a database cursor, in chunks, and
+produce the output a batch of rows at a time, so the memory used doesn't
+depend on the number of transactions.
+"""
+
+import base64
+import csv
+import io
+import json
+from datetime import datetime
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+from jajan.history.rollup import MONTH_TZ
+
+FIELDS = [
+    ('id', 'transaction_id'),
+    ('account', 'account_id'),
+    ('date', 'timestamp'),
+    ('description', 'description'),
+    ('category', 'category'),
+    ('custom_category', 'custom_category'),
+    ('type', 'type'),
+    ('amount', 'amount'),
+    ('currency', 'currency'),
+    ('transaction_currency', 'transaction_currency'),
+    ('rate', 'exchange_rate'),
+    ('reference', 'reference'),
+    ('note', 'note'),
+]
+
+COLUMNS = [name for name, _ in FIELDS]
+
+def values(queryset):
+    """Returns `queryset` as tuples in the order of COLUMNS."""
+    return queryset.values_list(*[field for _, field in FIELDS])
+
+def _local(row):
+    # timestamps are written in the statements' timezone
+    row = list(row)
+    row[2] = row[2].astimezone(MONTH_TZ).isoformat()
+    return row
+
+def to_dict(row):
+    return dict(zip(COLUMNS, _local(row)))
+
+def encode_cursor(timestamp, pk):
+    data = json.dumps([timestamp.isoformat(), pk]).encode('utf-8')
+    return base64.urlsafe_b64encode(data).decode('ascii')
+
+def decode_cursor(cursor):
+    """Returns the (timestamp, pk) of a cursor, raises ValueError when it's invalid."""
+    try:
+        timestamp, pk = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return datetime.fromisoformat(timestamp), int(pk)
+    except (TypeError, ValueError, UnicodeError) as e:
+        raise ValueError('invalid cursor') from e
+
+def page(queryset, limit, cursor=None):
+    """Returns the rows of the page after `cursor`, newest first, and the cursor of the next one.
+
+    Pages are found with the last (timestamp, id) of the previous one
+    instead of an OFFSET, so every page costs the same.
+    """
+    queryset = queryset.order_by('-timestamp', '-pk')
+    if cursor is not None:
+        timestamp, pk = decode_cursor(cursor)
+        queryset = queryset.filter(Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, pk__lt=pk))
+
+    rows = list(queryset.values_list('timestamp', 'pk', *[field for _, field in FIELDS])[:limit + 1])
+    following = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        following = encode_cursor(rows[-1][0], rows[-1][1])
+    return [to_dict(row[2:]) for row in rows], following
+
+class _Buffer(object):
+    def __init__(self):
+        self.buf = io.StringIO()
+
+    def write(self, data):
+        self.buf.write(data)
+
+    def take(self):
+        data = self.buf.getvalue()
+        self.buf = io.StringIO()
+        return data
+
+def _batches(queryset, chunk_size):
+    batch = []
+    for row in values(queryset).iterator(chunk_size=chunk_size):
+        batch.append(row)
+        if len(batch) == chunk_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def csv_lines(queryset, chunk_size=2000):
+    """Yields the transactions as CSV with a header, a chunk at a time."""
+    out = _Buffer()
+    writer = csv.writer(out)
+    writer.writerow(COLUMNS)
+    yield out.take()
+    for batch in _batches(queryset, chunk_size):
+        writer.writerows(_local(row) for row in batch)
+        yield out.take()
+
+def json_lines(queryset, chunk_size=2000):
+    """Yields the transactions as one JSON object per line, a chunk at a time."""
+    encoder = DjangoJSONEncoder()
+    for batch in _batches(queryset, chunk_size):
+        yield ''.join(encoder.encode(to_dict(row)) + '\n' for row in batch)
+
+async def aiterate(iterator):
+    """Wraps a synchronous iterator for ASGI responses.
+
+    Django buffers a whole synchronous iterator before sending it over ASGI,
+    this hands out one item at a time. The items are produced in the same
+    thread, which keeps the database cursor usable.
+    """
+    produce = sync_to_async(lambda: next(iterator, None))
+    while True:
+        item = await produce()
+        if item is None:
+            return
+        yield item
@@ -0,0 +1,136 @@
+from django.db import transaction
+
+from jajan.account.models import Account
+from jajan.history import reconcile, reports, rollup
+from jajan.history.bulkload import get_loader
+from jajan.history.models import Transaction
+from jajan.history.pipeline import card_number
+
+class ImportResult(object):
+    """Transaction ids of an import, by what happened to them."""
+
+    def __init__(self, account, account_created=False):
+        self.account = account
+        self.account_created = account_created
+        self.created = []
+        self.updated = []
+        self.unchanged = []
+        # new transactions skipped as copies of stored ones, see reconcile
+        self.duplicates = []
+
+def find_account(user, details):
+    """Returns the account the statement belongs to, or None."""
+    try:
+        return Account.objects.get(user=user, name=details['account'], card_number=card_number(details))
+    except Account.DoesNotExist:
+        return None
+
+def new_account(user, details):
+    return Account(user=user,
+            name=details['account'],
+            custom_name=None,
+            number=details['account_number'],
+            currency=details['currency'],
+            cashtag=details['cashtag'],
+            card_number=card_number(details))
+
+def new_transaction(account, item, fingerprint=None):
+    if fingerprint is None:
+        fingerprint = reconcile.item_fingerprint(item)
+    return Transaction(account=account,
+            transaction_id=item['id'],
+            amount=item['amount'],
+            category=item['category'],
+            timestamp=item['date'],
+            description=item['description'],
+            note=item['note'],
+            exchange_rate=item['rate'],
+            reference=item['reference'],
+            currency=item['currency'],
+            transaction_currency=item['transaction_currency'],
+            type=item['type'],
+            custom_category=None,
+            fingerprint=fingerprint)
+
+def import_transactions(user, details, transactions, loader=None):
+    """Stores the parsed transactions of a statement, returns an ImportResult.
+
+    The existing transactions of the account are read with one query, new
+    ones are inserted and changed categories written by `loader`, by default
+    the one of jajan.history.bulkload.get_loader, all in one database
+    transaction, along with the monthly summaries. The account is created
+    when it doesn't exist yet.
+
+    Transactions without an id get their fingerprint as id. A new
+    transaction without a valid id, see reconcile.valid_id, is skipped when
+    a stored one has the same fingerprint. Those with a valid id are always
+    stored, equal real transactions have equal fingerprints too, and are left
+    to the reconcile_transactions command. New transactions that the loader
+    didn't insert, because a concurrent import stored them first, count as
+    unchanged.
+    """
+    account = find_account(user, details)
+    result = ImportResult(account)
+
+    existing = {}
+    fingerprints = set()
+    if account is None:
+        account = result.account = new_account(user, details)
+        result.account_created = True
+    else:
+        rows = (Transaction.objects.filter(account=account)
+                .values_list('transaction_id', 'pk', 'category', 'fingerprint'))
+        for tid, pk, category, fingerprint in rows:
+            existing[tid] = (pk, category)
+            fingerprints.add(fingerprint)
+
+    # the statement is read before writing anything, so that the database
+    # isn't locked while the pages are parsed
+    new = []
+    changed = []
+    changes = rollup.Changes()
+    seen = set()
+    for item in transactions:
+        fingerprint = reconcile.item_fingerprint(item)
+        tid = item['id']
+        garbled = not reconcile.valid_id(tid)
+        if not tid:
+            tid = fingerprint
+            item = dict(item, id=tid)
+        if tid in seen:
+            continue
+        seen.add(tid)
+
+        if tid not in existing:
+            if garbled and fingerprint in fingerprints:
+                result.duplicates.append(tid)
+                continue
+            new.append(new_transaction(account, item, fingerprint))
+            continue
+
+        pk, category = existing[tid]
+        if category != item['category']:
+            changed.append(Transaction(pk=pk, category=item['category']))
+            changes.remove(item['date'], category, item['currency'], item['amount'])
+            changes.add(item['date'], item['category'], item['currency'], item['amount'])
+            result.updated.append(tid)
+        else:
+            result.unchanged.append(tid)
+
+    with transaction.atomic():
+        if result.account_created:
+            account.save()
+            for tx in new:
+                tx.account = account
+        inserted = set(tx.transaction_id for tx in (loader or get_loader()).load(new, changed))
+        for tx in new:
+            if tx.transaction_id not in inserted:
+                # stored by a concurrent import meanwhile
+                result.unchanged.append(tx.transaction_id)
+                continue
+            changes.add(tx.timestamp, tx.category, tx.currency, tx.amount)
+            result.created.append(tx.transaction_id)
+        rollup.update(account, changes)
+        transaction.on_commit(lambda: reports.invalidate(user.pk))
+
+    return result
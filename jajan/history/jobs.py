@@ -0,0 +1,217 @@
+"""Background imports of uploaded statements.
+
+Uploaded statements are imported by a small pool of threads, the request
+only registers an ImportJob and returns. The threads hand the parsing to a
+pool of processes, pdfminer is CPU bound and would hold the GIL of the web
+server, and only store the results. The workers report the pages read
+through shared values, so that a job's status shows its progress. Jobs are
+kept in memory, so
+their status is only known to the process that accepted the upload. The
+number of running and waiting jobs is limited, uploads beyond that are
+refused until a job finishes.
+"""
+
+import multiprocessing
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection
+
+from jajan.history.importer import import_transactions
+from jajan.history.pipeline import parse_statement
+
+class ImportJob(object):
+    QUEUED = 'queued'
+    PARSING = 'parsing'
+    STORING = 'storing'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    def __init__(self, user_id, filename):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.filename = filename
+        self.state = self.QUEUED
+        self.pages = 0
+        self.progress = None
+        self.transactions = 0
+        self.stored = 0
+        self.updated = 0
+        self.duplicates = 0
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+
+    @property
+    def active(self):
+        return self.finished is None
+
+    def pages_read(self):
+        # the value shared with the parsing process while it's running
+        progress = self.progress
+        if progress is None:
+            return self.pages
+        try:
+            return progress.value
+        except (OSError, EOFError):
+            return self.pages
+
+    def to_dict(self):
+        return dict(
+            id=self.id,
+            filename=self.filename,
+            state=self.state,
+            pages=self.pages_read(),
+            transactions=self.transactions,
+            stored=self.stored,
+            updated=self.updated,
+            duplicates=self.duplicates,
+            error=self.error,
+        )
+
+class QueueFull(Exception):
+    pass
+
+class UserLimitReached(Exception):
+    pass
+
+class ImportQueue(object):
+    """Runs ImportJobs on `workers` threads.
+
+    At most `workers + backlog` jobs are running or waiting, and a user has at
+    most `per_user` of them. Finished jobs are forgotten after `keep` seconds.
+    Statements are parsed by `parse_workers` processes, or in the threads
+    with 0. Jobs store their transactions one at a time so that the threads
+    don't compete for the database.
+    """
+
+    def __init__(self, workers=2, backlog=8, per_user=2, keep=3600, parse_workers=2, parse_options=None):
+        self.workers = workers
+        self.backlog = backlog
+        self.per_user = per_user
+        self.keep = keep
+        self.parse_workers = parse_workers
+        self.parse_options = parse_options or {}
+        self.jobs = {}
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._executor = None
+        self._parse_pool = None
+        self._manager = None
+
+    def submit(self, user_id, filename, data):
+        """Registers a job for the statement in `data` and starts it when a thread is free.
+
+        Raises QueueFull or UserLimitReached when the limits are reached.
+        """
+        with self._lock:
+            self._forget_finished()
+
+            active = [job for job in self.jobs.values() if job.active]
+            if len(active) >= self.workers + self.backlog:
+                raise QueueFull()
+            if sum(1 for job in active if job.user_id == user_id) >= self.per_user:
+                raise UserLimitReached()
+
+            job = ImportJob(user_id, filename)
+            self.jobs[job.id] = job
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                                    thread_name_prefix='import-job')
+
+        self._executor.submit(self._run, job, data)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def _forget_finished(self):
+        now = time.time()
+        for job_id, job in list(self.jobs.items()):
+            if not job.active and now - job.finished > self.keep:
+                del self.jobs[job_id]
+
+    def _run(self, job, data):
+        try:
+            self._import(job, data)
+            job.state = ImportJob.DONE
+        except Exception as e:
+            job.error = '{}: {}'.format(type(e).__name__, e)
+            job.state = ImportJob.FAILED
+        finally:
+            job.finished = time.time()
+            connection.close()
+
+    def _parse(self, job, data):
+        if not self.parse_workers:
+            job.progress = multiprocessing.Value('i', 0, lock=False)
+            return parse_statement(job.filename, self.parse_options, data=data, progress=job.progress)
+
+        with self._lock:
+            if self._parse_pool is None:
+                # not forked, the web server has threads running
+                context = multiprocessing.get_context('spawn')
+                self._parse_pool = ProcessPoolExecutor(max_workers=self.parse_workers, mp_context=context)
+                if self._manager is None:
+                    self._manager = context.Manager()
+            pool = self._parse_pool
+            job.progress = self._manager.Value('i', 0)
+        try:
+            return pool.submit(parse_statement, job.filename, self.parse_options,
+                               data=data, progress=job.progress).result()
+        except BrokenProcessPool:
+            # a worker died, start a new pool for the next jobs
+            with self._lock:
+                if self._parse_pool is pool:
+                    self._parse_pool = None
+            raise
+
+    def _import(self, job, data):
+        job.state = ImportJob.PARSING
+        try:
+            parsed = self._parse(job, data)
+        finally:
+            job.pages = job.pages_read()
+            job.progress = None
+        details, transactions = parsed.details, parsed.transactions
+        job.transactions = len(transactions)
+
+        if details is None:
+            raise ValueError('no statement found')
+
+        job.state = ImportJob.STORING
+        user = User.objects.get(pk=job.user_id)
+        with self._write_lock:
+            result = import_transactions(user, details, transactions)
+        job.stored = len(result.created)
+        job.updated = len(result.updated)
+        job.duplicates = len(result.duplicates)
+
+def _parse_options():
+    cache_dir = getattr(settings, 'PARSER_CACHE_DIR', None)
+    return dict(
+        cache_dir=str(cache_dir) if cache_dir is not None else None,
+        cache_size=getattr(settings, 'PARSER_CACHE_SIZE', 256 * 1024 * 1024))
+
+_queue = None
+_queue_lock = threading.Lock()
+
+def get_queue():
+    """Returns the ImportQueue of this process, configured by the IMPORT_* settings."""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = ImportQueue(
+                workers=getattr(settings, 'IMPORT_WORKERS', 2),
+                backlog=getattr(settings, 'IMPORT_BACKLOG', 8),
+                per_user=getattr(settings, 'IMPORT_JOBS_PER_USER', 2),
+                keep=getattr(settings, 'IMPORT_JOB_KEEP', 3600),
+                parse_workers=getattr(settings, 'IMPORT_PARSE_WORKERS', 2),
+                parse_options=_parse_options())
+        return _queue
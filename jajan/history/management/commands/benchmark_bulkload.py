@@ -0,0 +1,59 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from jajan.history.bulkload import get_loader
+from jajan.history.importer import new_account, new_transaction
+from jajan.history.models import Transaction
+
+from jenius.transaction import synthetic
+
+class Command(BaseCommand):
+    help = 'Compares the rows per second of the bulk loaders on synthetic transactions.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000)
+        parser.add_argument('--loader', nargs='+', choices=['orm', 'native'], default=['orm', 'native'])
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        items = {}
+        for item in synthetic.make_transactions(options['rows'], seed=options['seed']):
+            items.setdefault(item['id'], item)
+        items = list(items.values())
+
+        # everything is stored under a throwaway user, removed at the end
+        user = User.objects.create(username='bulkload-benchmark-{}'.format(int(time.time())))
+        try:
+            self.stdout.write('{} rows on {}'.format(len(items), connection.vendor))
+            self.stdout.write('{:<12} {:>10} {:>12} {:>10} {:>12}'.format(
+                'loader', 'insert s', 'inserts/s', 'update s', 'updates/s'))
+            for n, name in enumerate(options['loader']):
+                self.run(user, n, name, items)
+        finally:
+            user.delete()
+
+    def run(self, user, n, name, items):
+        loader = get_loader(name=name)
+        details = dict(account='Benchmark {}'.format(n), account_number='0', currency='IDR',
+                       cashtag='', card_number=str(n))
+        account = new_account(user, details)
+        account.save()
+
+        new = [new_transaction(account, item) for item in items]
+        start = time.perf_counter()
+        with transaction.atomic():
+            loader.load(new, [])
+        insert = time.perf_counter() - start
+
+        changed = [Transaction(pk=pk, category='Benchmark')
+                   for pk in Transaction.objects.filter(account=account).values_list('pk', flat=True)]
+        start = time.perf_counter()
+        with transaction.atomic():
+            loader.load([], changed)
+        update = time.perf_counter() - start
+
+        self.stdout.write('{:<12} {:>10.3f} {:>12.0f} {:>10.3f} {:>12.0f}'.format(
+            loader.name, insert, len(new) / insert, update, len(changed) / update))
@@ -1,72 +1,99 @@
-import re
+import os
 
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.core.management.base import BaseCommand, CommandError
 
-from jajan.account.models import Account
+from jajan.history.importer import import_transactions
 from jajan.history.models import Transaction
+from jajan.history.pipeline import ImportPipeline
 
-from jenius.transaction.parser import Parser
+from jenius.transaction.cli import find_files
+from jenius.transaction.stats import ParserStats
 
 class Command(BaseCommand):
     def add_arguments(self, parser):
         parser.add_argument('--user-id', required=True, type=int)
-        parser.add_argument('--file', required=True, type=str)
+        parser.add_argument('--file', required=True, type=str, nargs='+',
+                help='statement files or directories of statements')
+        parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1,
+                help='number of parsing processes, default the number of CPUs')
+        parser.add_argument('--fast', action='store_true',
+                help='skip pdfminer layout analysis and group the text in the parser')
+        parser.add_argument('--cache', dest='cache', action='store_true', default=None,
+                help='use the parsed statements cache in PARSER_CACHE_DIR (default)')
+        parser.add_argument('--no-cache', dest='cache', action='store_false',
+                help='always parse the statement')
+        parser.add_argument('--incremental', action='store_true',
+                help='stop reading the statement after a page with only known transactions')
+        parser.add_argument('--profile', action='store_true',
+                help='print the time spent in every parser stage')
+        parser.add_argument('--profile-memory', action='store_true',
+                help='like --profile, also trace the memory allocated by every stage')
 
     def handle(self, *args, **options):
         user_id = options['user_id']
         user = User.objects.get(pk=user_id)
 
-        inp = options['file']
-        with open(inp, 'rb') as f:
-            p = Parser()
-            data = p.parse(f)
-
-            try:
-                card_number = re.sub(r'\s+', '', data.details['card_number'])
-                account = Account.objects.get(user=user, name=data.details['account'], card_number=card_number)
-
-                self.stdout.write(self.style.SUCCESS('Found existing account: {} ({})'.format(account.name, account.card_number)))
-            except Account.DoesNotExist:
-                account = Account(user=user,
-                        name=data.details['account'],
-                        custom_name=None,
-                        number=data.details['account_number'],
-                        currency=data.details['currency'],
-                        cashtag=data.details['cashtag'],
-                        card_number=card_number)
-                account.save()
-
-                self.stdout.write(self.style.SUCCESS('Created a new account: {} ({})'.format(account.name, account.card_number)))
-
-            for item in data.transactions:
-                try:
-                    tx = Transaction.objects.get(account=account, transaction_id=item['id'])
-
-                    if tx.category != item['category']:
-                        tx['category'] = item['category']
-                        tx.save()
-                        self.stdout.write('Updated category on transaction {}'.format(tx.transaction_id))
-
-                    else:
-                        self.stdout.write('Found existing transaction {}'.format(tx.transaction_id))
-
-
-                except Transaction.DoesNotExist:
-                    tx = Transaction(account=account,
-                            transaction_id=item['id'],
-                            amount=item['amount'],
-                            category=item['category'],
-                            timestamp=item['date'],
-                            description=item['description'],
-                            note=item['note'],
-                            exchange_rate=item['rate'],
-                            reference=item['reference'],
-                            currency=item['currency'],
-                            transaction_currency=item['transaction_currency'],
-                            type=item['type'],
-                            custom_category=None)
-                    tx.save()
-
-                    self.stdout.write('Stored a new transaction {}'.format(tx.transaction_id))
-
+        cache_dir = getattr(settings, 'PARSER_CACHE_DIR', None)
+        if options['cache'] is None:
+            options['cache'] = cache_dir is not None
+        if options['cache'] and cache_dir is None:
+            raise CommandError('PARSER_CACHE_DIR is not set')
+
+        known = None
+        if options['incremental']:
+            # read once here, the parsing processes don't use the database
+            known = {}
+            rows = (Transaction.objects.filter(account__user=user)
+                    .values_list('account__name', 'account__card_number', 'transaction_id'))
+            for name, card_number, transaction_id in rows.iterator():
+                known.setdefault((name, card_number), set()).add(transaction_id)
+
+        stats = None
+        if options['profile'] or options['profile_memory']:
+            stats = ParserStats()
+
+        pipeline = ImportPipeline(
+                lambda parsed: import_transactions(user, parsed.details, parsed.transactions),
+                jobs=options['jobs'],
+                options=dict(
+                    fast=options['fast'],
+                    cache_dir=str(cache_dir) if options['cache'] else None,
+                    cache_size=getattr(settings, 'PARSER_CACHE_SIZE', 256 * 1024 * 1024),
+                    profile=stats is not None,
+                    memory=options['profile_memory']),
+                known=known,
+                stats=stats,
+                on_stored=lambda path, result: self.report(path, result, options['verbosity']),
+                on_failed=lambda path, e: self.stderr.write(self.style.ERROR(
+                    '{}: {}: {}'.format(path, type(e).__name__, e))))
+
+        pipeline.run(find_files(options['file']))
+
+        if stats is not None:
+            stats.report(out=self.stderr)
+
+        self.stdout.write('Imported {} statements'.format(pipeline.stored))
+        if pipeline.failed:
+            raise CommandError('{} statements failed'.format(pipeline.failed))
+
+    def report(self, path, result, verbosity):
+        account = result.account
+        if result.account_created:
+            self.stdout.write(self.style.SUCCESS('{}: created a new account: {} ({})'.format(path, account.name, account.card_number)))
+        else:
+            self.stdout.write(self.style.SUCCESS('{}: found existing account: {} ({})'.format(path, account.name, account.card_number)))
+
+        if verbosity > 1:
+            for tid in result.created:
+                self.stdout.write('Stored a new transaction {}'.format(tid))
+            for tid in result.updated:
+                self.stdout.write('Updated category on transaction {}'.format(tid))
+            for tid in result.unchanged:
+                self.stdout.write('Found existing transaction {}'.format(tid))
+            for tid in result.duplicates:
+                self.stdout.write('Skipped transaction {}, a copy of a stored one'.format(tid))
+
+        self.stdout.write('{}: stored {} new transactions, updated {}, {} unchanged, {} duplicates skipped'.format(
+            path, len(result.created), len(result.updated), len(result.unchanged), len(result.duplicates)))
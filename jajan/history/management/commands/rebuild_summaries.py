@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from jajan.account.models import Account
+from jajan.history import reports, rollup
+
+class Command(BaseCommand):
+    help = 'Recomputes the monthly summaries from the transactions.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--account-id', type=int, nargs='*',
+                help='accounts to rebuild, all of them by default')
+
+    def handle(self, *args, **options):
+        accounts = Account.objects.all()
+        if options['account_id']:
+            accounts = accounts.filter(pk__in=options['account_id'])
+
+        for account in accounts:
+            rollup.rebuild(account)
+            reports.invalidate(account.user_id)
+            self.stdout.write('Rebuilt the summaries of {}'.format(account))
@@ -0,0 +1,67 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from jajan.account.models import Account
+from jajan.history import reconcile, reports, rollup
+from jajan.history.models import Transaction
+
+class Command(BaseCommand):
+    help = 'Finds transactions stored twice, e.g. from overlapping statements with garbled ids.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user-id', type=int,
+                help='only the accounts of this user')
+        parser.add_argument('--account-id', type=int, nargs='*',
+                help='accounts to check, all of them by default')
+        parser.add_argument('--window', type=int, default=60,
+                help='seconds between transactions of the same type and amount reported as '
+                     'possible duplicates, default 60')
+        parser.add_argument('--delete', action='store_true',
+                help='delete the exact duplicates without a valid transaction id, the others '
+                     'may be equal real transactions and are only reported')
+
+    def handle(self, *args, **options):
+        accounts = Account.objects.select_related('user').order_by('pk')
+        if options['user_id'] is not None:
+            accounts = accounts.filter(user_id=options['user_id'])
+        if options['account_id']:
+            accounts = accounts.filter(pk__in=options['account_id'])
+
+        window = timedelta(seconds=options['window'])
+        for account in accounts:
+            exact = 0
+            removable = set()
+            near = 0
+            for duplicate in reconcile.find_duplicates(account, window=window):
+                self.report(account, duplicate, options['verbosity'])
+                if duplicate.exact:
+                    exact += 1
+                    if duplicate.removable is not None:
+                        removable.add(duplicate.removable.pk)
+                else:
+                    near += 1
+
+            if options['delete'] and removable:
+                with transaction.atomic():
+                    Transaction.objects.filter(pk__in=removable).delete()
+                    rollup.rebuild(account)
+                reports.invalidate(account.user_id)
+
+            self.stdout.write('{}: {} exact duplicates, {} of them without a valid id{}, {} possible duplicates'.format(
+                account, exact, len(removable), ' deleted' if options['delete'] else '', near))
+
+    def report(self, account, duplicate, verbosity):
+        if not duplicate.exact and verbosity < 2:
+            return
+        copy, original = duplicate.copy, duplicate.original
+        if duplicate.exact:
+            kind = 'duplicate' if duplicate.removable is not None else 'duplicate with a valid id'
+        else:
+            kind = 'possible duplicate'
+        self.stdout.write('{}: {} {} {} {} {} looks like {} ({})'.format(
+            account, kind,
+            copy.transaction_id, copy.timestamp.isoformat(), copy.amount, copy.description,
+            original.transaction_id, 'same fingerprint' if duplicate.exact else
+            '{:.0f}s earlier'.format((copy.timestamp - original.timestamp).total_seconds())))
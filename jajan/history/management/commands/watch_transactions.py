@@ -0,0 +1,131 @@
+import hashlib
+import io
+import os
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from jajan.history.importer import import_transactions
+from jajan.history.models import ImportedFile
+from jajan.history.watcher import PollingWatcher, watcher
+
+from jenius.transaction.cache import ParseCache
+from jenius.transaction.parser import Parser
+
+class Command(BaseCommand):
+    help = 'Imports the statements written to a directory as they arrive.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user-id', required=True, type=int)
+        parser.add_argument('--dir', required=True, type=str,
+                help='directory to watch for statements')
+        parser.add_argument('--settle', type=float, default=2.0,
+                help='seconds a file has to stay unchanged before it is imported')
+        parser.add_argument('--poll', action='store_true',
+                help='poll the directory instead of using inotify')
+        parser.add_argument('--interval', type=float, default=2.0,
+                help='seconds between directory scans when polling')
+        parser.add_argument('--fast', action='store_true',
+                help='skip pdfminer layout analysis and group the text in the parser')
+        parser.add_argument('--once', action='store_true',
+                help='import the statements already in the directory and exit')
+
+    def handle(self, *args, **options):
+        user = User.objects.get(pk=options['user_id'])
+        path = os.path.abspath(options['dir'])
+        if not os.path.isdir(path):
+            raise CommandError('{} is not a directory'.format(path))
+
+        cache = None
+        cache_dir = getattr(settings, 'PARSER_CACHE_DIR', None)
+        if cache_dir is not None:
+            cache = ParseCache(cache_dir, max_size=getattr(settings, 'PARSER_CACHE_SIZE', 256 * 1024 * 1024))
+
+        # one parser for the whole run keeps pdfminer's resources warm
+        self.parser = Parser(fast=options['fast'], cache=cache)
+        self.user = user
+        self.settle = options['settle']
+
+        w = watcher(path, polling=options['poll'], interval=options['interval'])
+        if not isinstance(w, PollingWatcher):
+            self.stdout.write('Watching {} with inotify'.format(path))
+        else:
+            self.stdout.write('Watching {} by polling every {}s'.format(path, w.interval))
+
+        # path -> (size, mtime, time the stat last changed)
+        pending = {}
+        self.notice(pending, w.initial())
+        try:
+            while pending or not options['once']:
+                # wake up when the next pending file has settled
+                timeout = self.settle
+                if pending:
+                    now = time.monotonic()
+                    timeout = max(0.1, min(changed + self.settle - now for _, _, changed in pending.values()))
+                self.notice(pending, w.wait(timeout))
+                self.process(pending)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            w.close()
+
+    def notice(self, pending, paths):
+        now = time.monotonic()
+        for p in paths:
+            if not p.lower().endswith('.pdf'):
+                continue
+            try:
+                st = os.stat(p)
+            except FileNotFoundError:
+                pending.pop(p, None)
+                continue
+            stat = (st.st_size, st.st_mtime)
+            old = pending.get(p)
+            if old is None or old[:2] != stat:
+                pending[p] = stat + (now,)
+
+    def process(self, pending):
+        now = time.monotonic()
+        for p, (size, mtime, changed) in list(pending.items()):
+            try:
+                st = os.stat(p)
+            except FileNotFoundError:
+                del pending[p]
+                continue
+
+            # files still being written keep changing, wait until they settle
+            if (st.st_size, st.st_mtime) != (size, mtime):
+                pending[p] = (st.st_size, st.st_mtime, now)
+                continue
+            if now - changed < self.settle:
+                continue
+
+            del pending[p]
+            close_old_connections()
+            try:
+                self.ingest(p, size, mtime)
+            except Exception as e:
+                self.stderr.write(self.style.ERROR('{}: {}: {}'.format(p, type(e).__name__, e)))
+
+    def ingest(self, path, size, mtime):
+        files = ImportedFile.objects.filter(user=self.user)
+        record = files.filter(path=path).first()
+        if record is not None and record.size == size and record.mtime == mtime:
+            return
+
+        with open(path, 'rb') as f:
+            data = f.read()
+        sha256 = hashlib.sha256(data).hexdigest()
+
+        if not files.filter(sha256=sha256).exists():
+            data = self.parser.stream(io.BytesIO(data))
+            result = import_transactions(self.user, data.details, data.transactions)
+            self.stdout.write(self.style.SUCCESS('{}: stored {} new transactions, updated {}, {} duplicates skipped'.format(
+                path, len(result.created), len(result.updated), len(result.duplicates))))
+        else:
+            self.stdout.write('{}: already imported'.format(path))
+
+        ImportedFile.objects.update_or_create(user=self.user, path=path, defaults=dict(size=size, mtime=mtime, sha256=sha256))
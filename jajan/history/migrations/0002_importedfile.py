@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('history', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportedFile',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(max_length=1024, unique=True)),
+                ('size', models.BigIntegerField()),
+                ('mtime', models.FloatField()),
+                ('sha256', models.CharField(db_index=True, max_length=64)),
+                ('imported', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
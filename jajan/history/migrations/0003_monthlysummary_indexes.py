@@ -0,0 +1,70 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:48
+
+from decimal import Decimal
+from zoneinfo import ZoneInfo
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# copied from jajan.history.rollup, so that later changes to the app don't
+# change what this migration does
+MONTH_TZ = ZoneInfo('Asia/Jakarta')
+
+
+def build_summaries(apps, schema_editor):
+    Account = apps.get_model('account', 'Account')
+    Transaction = apps.get_model('history', 'Transaction')
+    MonthlySummary = apps.get_model('history', 'MonthlySummary')
+    for account in Account.objects.all():
+        totals = {}
+        rows = (Transaction.objects.filter(account=account)
+                .values_list('timestamp', 'category', 'currency', 'amount'))
+        for timestamp, category, currency, amount in rows.iterator(chunk_size=5000):
+            key = (timestamp.astimezone(MONTH_TZ).date().replace(day=1), category, currency)
+            total = totals.setdefault(key, [0, Decimal(0)])
+            total[0] += 1
+            total[1] += amount
+        MonthlySummary.objects.bulk_create([
+            MonthlySummary(account=account, month=month, category=category, currency=currency,
+                           count=count, amount=amount)
+            for (month, category, currency), (count, amount) in totals.items()])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0001_initial'),
+        ('history', '0002_importedfile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlySummary',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('category', models.CharField(max_length=50)),
+                ('currency', models.CharField(max_length=3)),
+                ('count', models.IntegerField(default=0)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['account', 'timestamp'], name='history_tx_account_time'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['account', 'category', 'timestamp'], name='history_tx_account_cat_time'),
+        ),
+        migrations.AddField(
+            model_name='monthlysummary',
+            name='account',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='account.account'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='monthlysummary',
+            unique_together={('account', 'month', 'category', 'currency')},
+        ),
+        migrations.RunPython(build_summaries, migrations.RunPython.noop),
+    ]
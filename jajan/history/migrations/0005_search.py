@@ -0,0 +1,65 @@
+from django.db import migrations
+
+# SQLite: an external content FTS5 table kept up to date by triggers, as
+# (name, sql). prefix='2 3' indexes the short prefixes that searches ask for.
+SQLITE_TRIGGERS = [
+    ('history_transaction_fts_insert', """CREATE TRIGGER history_transaction_fts_insert AFTER INSERT ON history_transaction BEGIN
+        INSERT INTO history_transaction_fts (rowid, description, note, reference)
+        VALUES (new.id, new.description, new.note, new.reference);
+    END"""),
+    ('history_transaction_fts_delete', """CREATE TRIGGER history_transaction_fts_delete AFTER DELETE ON history_transaction BEGIN
+        INSERT INTO history_transaction_fts (history_transaction_fts, rowid, description, note, reference)
+        VALUES ('delete', old.id, old.description, old.note, old.reference);
+    END"""),
+    ('history_transaction_fts_update', """CREATE TRIGGER history_transaction_fts_update AFTER UPDATE OF description, note, reference ON history_transaction BEGIN
+        INSERT INTO history_transaction_fts (history_transaction_fts, rowid, description, note, reference)
+        VALUES ('delete', old.id, old.description, old.note, old.reference);
+        INSERT INTO history_transaction_fts (rowid, description, note, reference)
+        VALUES (new.id, new.description, new.note, new.reference);
+    END"""),
+]
+
+SQLITE_FORWARDS = [
+    """CREATE VIRTUAL TABLE history_transaction_fts USING fts5(
+        description, note, reference,
+        content='history_transaction', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3')""",
+] + [sql for _, sql in SQLITE_TRIGGERS] + [
+    "INSERT INTO history_transaction_fts (history_transaction_fts) VALUES ('rebuild')",
+]
+
+SQLITE_BACKWARDS = ['DROP TRIGGER {}'.format(name) for name, _ in reversed(SQLITE_TRIGGERS)] + [
+    'DROP TABLE history_transaction_fts',
+]
+
+# PostgreSQL: a GIN index on the same expression as jajan.history.search,
+# the database maintains it on every write.
+POSTGRESQL_FORWARDS = [
+    """CREATE INDEX history_tx_search ON history_transaction USING GIN (
+        to_tsvector('simple', coalesce(description, '') || ' ' || coalesce(note, '') || ' ' || coalesce(reference, '')))""",
+]
+
+POSTGRESQL_BACKWARDS = [
+    'DROP INDEX history_tx_search',
+]
+
+def _run(statements):
+    def run(apps, schema_editor):
+        vendor = schema_editor.connection.vendor
+        for sql in statements.get(vendor, []):
+            schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('history', '0004_admin_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            _run(dict(sqlite=SQLITE_FORWARDS, postgresql=POSTGRESQL_FORWARDS)),
+            _run(dict(sqlite=SQLITE_BACKWARDS, postgresql=POSTGRESQL_BACKWARDS)),
+        ),
+    ]
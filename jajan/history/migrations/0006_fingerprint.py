@@ -0,0 +1,75 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:54
+
+import hashlib
+import importlib
+from datetime import timezone
+from decimal import Decimal
+
+from django.db import migrations, models
+
+search = importlib.import_module('jajan.history.migrations.0005_search')
+
+
+def _text(value):
+    return ' '.join((value or '').split()).casefold()
+
+
+def _fingerprint(timestamp, amount, description, type):
+    # jajan.history.reconcile.fingerprint as of this migration
+    parts = [
+        timestamp.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S'),
+        str(Decimal(amount).quantize(Decimal('0.01'))),
+        _text(description),
+        _text(type),
+    ]
+    return hashlib.sha1('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+
+def restore_search_triggers(apps, schema_editor):
+    # SQLite adds the column by copying the table into a new one, which
+    # drops the triggers keeping the search index of 0005 up to date
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for name, sql in search.SQLITE_TRIGGERS:
+        schema_editor.execute('DROP TRIGGER IF EXISTS {}'.format(name))
+        schema_editor.execute(sql)
+
+
+def fill_fingerprints(apps, schema_editor):
+    Transaction = apps.get_model('history', 'Transaction')
+    rows = Transaction.objects.only('timestamp', 'amount', 'description', 'type').order_by('pk')
+    batch = []
+    for tx in rows.iterator(chunk_size=5000):
+        tx.fingerprint = _fingerprint(tx.timestamp, tx.amount, tx.description, tx.type)
+        batch.append(tx)
+        if len(batch) == 5000:
+            Transaction.objects.bulk_update(batch, ['fingerprint'])
+            batch = []
+    Transaction.objects.bulk_update(batch, ['fingerprint'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0001_initial'),
+        ('history', '0005_search'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, restore_search_triggers),
+        migrations.AddField(
+            model_name='transaction',
+            name='fingerprint',
+            field=models.CharField(default='', max_length=40),
+        ),
+        migrations.RunPython(fill_fingerprints, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['account', 'fingerprint'], name='history_tx_fingerprint'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['account', 'type', 'amount', 'timestamp'], name='history_tx_account_amount'),
+        ),
+        migrations.RunPython(restore_search_triggers, migrations.RunPython.noop),
+    ]
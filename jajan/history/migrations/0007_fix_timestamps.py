@@ -0,0 +1,97 @@
+import hashlib
+from datetime import datetime, timezone
+from decimal import Decimal
+from zoneinfo import ZoneInfo
+
+import pytz
+from django.core.cache import cache
+from django.db import migrations
+
+# Everything is copied here rather than imported from the app, so that later
+# changes to the app don't change what this migration does.
+
+# parse_date attached pytz's LMT of Asia/Jakarta before PARSER_VERSION 2
+# instead of WIB, which stored every transaction 7 minutes early
+TZ = pytz.timezone('Asia/Jakarta')
+LMT = timezone(datetime(2000, 1, 1, tzinfo=TZ).utcoffset())
+MONTH_TZ = ZoneInfo('Asia/Jakarta')
+
+
+def _wib(timestamp):
+    return TZ.localize(timestamp.astimezone(LMT).replace(tzinfo=None))
+
+def _lmt(timestamp):
+    return timestamp.astimezone(TZ).replace(tzinfo=LMT)
+
+def _text(value):
+    return ' '.join((value or '').split()).casefold()
+
+def _fingerprint(timestamp, amount, description, type):
+    # jajan.history.reconcile.fingerprint as of this migration
+    parts = [
+        timestamp.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S'),
+        str(Decimal(amount).quantize(Decimal('0.01'))),
+        _text(description),
+        _text(type),
+    ]
+    return hashlib.sha1('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+def _rebuild_summaries(account, Transaction, MonthlySummary):
+    # transactions close to midnight may change months
+    totals = {}
+    rows = (Transaction.objects.filter(account=account)
+            .values_list('timestamp', 'category', 'currency', 'amount'))
+    for timestamp, category, currency, amount in rows.iterator(chunk_size=5000):
+        key = (timestamp.astimezone(MONTH_TZ).date().replace(day=1), category, currency)
+        total = totals.setdefault(key, [0, Decimal(0)])
+        total[0] += 1
+        total[1] += amount
+
+    MonthlySummary.objects.filter(account=account).delete()
+    MonthlySummary.objects.bulk_create([
+        MonthlySummary(account=account, month=month, category=category, currency=currency,
+                       count=count, amount=amount)
+        for (month, category, currency), (count, amount) in totals.items()])
+
+def _invalidate_reports(user_id):
+    # bumps the version in the keys of jajan.history.reports
+    key = 'history:reports:version:{}'.format(user_id)
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+def _shift(convert):
+    def shift(apps, schema_editor):
+        Account = apps.get_model('account', 'Account')
+        Transaction = apps.get_model('history', 'Transaction')
+        MonthlySummary = apps.get_model('history', 'MonthlySummary')
+
+        rows = Transaction.objects.only('timestamp', 'amount', 'description', 'type').order_by('pk')
+        batch = []
+        for tx in rows.iterator(chunk_size=5000):
+            tx.timestamp = convert(tx.timestamp)
+            tx.fingerprint = _fingerprint(tx.timestamp, tx.amount, tx.description, tx.type)
+            batch.append(tx)
+            if len(batch) == 5000:
+                Transaction.objects.bulk_update(batch, ['timestamp', 'fingerprint'])
+                batch = []
+        Transaction.objects.bulk_update(batch, ['timestamp', 'fingerprint'])
+
+        for account in Account.objects.all():
+            _rebuild_summaries(account, Transaction, MonthlySummary)
+            _invalidate_reports(account.user_id)
+    return shift
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0001_initial'),
+        ('history', '0006_fingerprint'),
+    ]
+
+    operations = [
+        migrations.RunPython(_shift(_wib), _shift(_lmt)),
+    ]
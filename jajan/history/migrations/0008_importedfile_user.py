@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:26
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def forget_imported_files(apps, schema_editor):
+    # the user of the files can't be told, nor which user's one of a path
+    # to keep when going back. watch_transactions reads them once more,
+    # which stores nothing new
+    apps.get_model('history', 'ImportedFile').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('history', '0007_fix_timestamps'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(forget_imported_files, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='importedfile',
+            name='user',
+            field=models.ForeignKey(default=1, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name='importedfile',
+            name='path',
+            field=models.CharField(max_length=1024),
+        ),
+        migrations.AlterField(
+            model_name='importedfile',
+            name='sha256',
+            field=models.CharField(max_length=64),
+        ),
+        migrations.AlterUniqueTogether(
+            name='importedfile',
+            unique_together={('user', 'path')},
+        ),
+        migrations.AddIndex(
+            model_name='importedfile',
+            index=models.Index(fields=['user', 'sha256'], name='history_file_user_sha256'),
+        ),
+        migrations.RunPython(migrations.RunPython.noop, forget_imported_files),
+    ]
@@ -1,3 +1,4 @@
+from django.contrib.auth.models import User
 from django.db import models
 
 from jajan.account.models import Account
@@ -5,6 +6,17 @@ from jajan.account.models import Account
 class Transaction(models.Model):
     class Meta:
         unique_together = (('account', 'transaction_id',),)
+        indexes = [
+            models.Index(fields=['account', 'timestamp'], name='history_tx_account_time'),
+            models.Index(fields=['account', 'category', 'timestamp'], name='history_tx_account_cat_time'),
+            # for the admin, which filters and searches across accounts
+            models.Index(fields=['timestamp'], name='history_tx_time'),
+            models.Index(fields=['category'], name='history_tx_category'),
+            models.Index(fields=['transaction_id'], name='history_tx_transaction_id'),
+            # for jajan.history.reconcile
+            models.Index(fields=['account', 'fingerprint'], name='history_tx_fingerprint'),
+            models.Index(fields=['account', 'type', 'amount', 'timestamp'], name='history_tx_account_amount'),
+        ]
 
     account = models.ForeignKey(Account, on_delete=models.CASCADE)
     transaction_id = models.CharField(max_length=50)
@@ -20,4 +32,40 @@ class Transaction(models.Model):
     transaction_currency = models.CharField(max_length=3)
     type = models.CharField(max_length=50)
     custom_category = models.CharField(max_length=50, null=True)
+    # see jajan.history.reconcile.fingerprint
+    fingerprint = models.CharField(max_length=40, default='')
 
+
+class ImportedFile(models.Model):
+    """A statement file already imported by watch_transactions for a user."""
+
+    class Meta:
+        unique_together = (('user', 'path',),)
+        indexes = [
+            models.Index(fields=['user', 'sha256'], name='history_file_user_sha256'),
+        ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    path = models.CharField(max_length=1024)
+    size = models.BigIntegerField()
+    mtime = models.FloatField()
+    sha256 = models.CharField(max_length=64)
+    imported = models.DateTimeField(auto_now=True)
+
+class MonthlySummary(models.Model):
+    """Number and sum of the transactions of an account in a month.
+
+    Months are in Asia/Jakarta time and `month` is their first day. The
+    importer keeps the summaries up to date, rebuild_summaries recomputes
+    them from the transactions.
+    """
+
+    class Meta:
+        unique_together = (('account', 'month', 'category', 'currency',),)
+
+    account = models.ForeignKey(Account, on_delete=models.CASCADE)
+    month = models.DateField()
+    category = models.CharField(max_length=50)
+    currency = models.CharField(max_length=3)
+    count = models.IntegerField(default=0)
+    amount = models.DecimalField(decimal_places=2, max_digits=20, default=0)
@@ -0,0 +1,215 @@
+"""Parses statements in worker processes and stores them from one thread.
+
+Statements are parsed in a process pool, or in the calling thread with a
+single job, and handed over to a writer thread through a bounded queue. The
+writer stores them in groups, one database transaction per group, so that
+parsing and writing overlap and only one thread ever writes to the database.
+
+This module doesn't import the models, the worker processes don't set up
+Django.
+"""
+
+import io
+import multiprocessing
+import queue
+import re
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from django.db import connection, transaction
+
+from jenius.transaction.cache import ParseCache
+from jenius.transaction.parser import Parser
+from jenius.transaction.stats import ParserStats
+
+def card_number(details):
+    return re.sub(r'\s+', '', details['card_number'])
+
+def account_key(details):
+    """Returns the (name, card number) identifying the account of a statement."""
+    return details['account'], card_number(details)
+
+class ParsedStatement(object):
+    def __init__(self, path, details, transactions, records=None):
+        self.path = path
+        self.details = details
+        self.transactions = transactions
+        self.records = records
+
+_known = None
+
+def _init_worker(known):
+    global _known
+    _known = known
+
+def parse_statement(path, options, known=None, data=None, progress=None):
+    """Parses the statement at `path` into a ParsedStatement.
+
+    `options` has the fast, cache_dir, cache_size, profile and memory
+    settings. With `known`, a dict of account_key to the transaction ids
+    already stored, parsing stops early as with Parser.stream. With `data`,
+    the statement is read from these bytes and `path` only names it. The
+    number of pages read is written to the value of `progress`, e.g. a
+    multiprocessing Value, as they are read.
+    """
+    if known is None:
+        known = _known
+
+    cache = None
+    if options.get('cache_dir'):
+        cache = ParseCache(options['cache_dir'], max_size=options['cache_size'])
+    stats = None
+    if options.get('profile'):
+        stats = ParserStats(memory=options.get('memory', False), statement=path)
+
+    def is_known(details):
+        ids = known.get(account_key(details))
+        if ids is None:
+            return None
+        return lambda tx: tx['id'] in ids
+
+    parser = Parser(fast=options.get('fast', False), cache=cache, stats=stats)
+    with (open(path, 'rb') if data is None else io.BytesIO(data)) as f:
+        on_page = None
+        if progress is not None:
+            on_page = lambda pages: setattr(progress, 'value', pages)
+        parsed = parser.stream(f, known=is_known if known is not None else None, on_page=on_page)
+        transactions = list(parsed.transactions)
+
+    records = stats.records if stats is not None else None
+    return ParsedStatement(path, parsed.details, transactions, records)
+
+class ImportPipeline(object):
+    """Parses statements and stores them with `store`.
+
+    `store` is called in the writer thread with every ParsedStatement and
+    returns what `on_stored` receives. `on_failed` is called with the path
+    and the exception of statements that couldn't be parsed or stored,
+    `on_stored` with the path and the result of `store`. Both may be called
+    from the writer thread.
+    """
+
+    def __init__(self, store, jobs=1, options=None, known=None, stats=None,
+                 queue_size=None, group_size=8, on_stored=None, on_failed=None):
+        self.store = store
+        self.jobs = jobs
+        self.options = options or {}
+        self.known = known
+        self.stats = stats
+        self.queue_size = queue_size or max(2, jobs * 2)
+        self.group_size = group_size
+        self.on_stored = on_stored
+        self.on_failed = on_failed
+        self.stored = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+
+    def run(self, paths):
+        """Imports all the statements, returns once they are stored."""
+        q = queue.Queue(self.queue_size)
+        writer = threading.Thread(target=self._write, args=(q,), name='import-writer')
+        writer.start()
+        try:
+            for path, parsed, error in self._parse(paths):
+                if error is not None:
+                    self._failed(path, error)
+                    continue
+                if parsed.records and self.stats is not None:
+                    self.stats.extend(parsed.records)
+                self._put(q, parsed, writer)
+        finally:
+            if writer.is_alive():
+                self._put(q, None, writer)
+            writer.join()
+
+    def _put(self, q, item, writer):
+        while True:
+            try:
+                q.put(item, timeout=1)
+                return
+            except queue.Full:
+                if not writer.is_alive():
+                    raise RuntimeError('the import writer thread stopped')
+
+    def _parse(self, paths):
+        if self.jobs <= 1:
+            for path in paths:
+                try:
+                    yield path, parse_statement(path, self.options, self.known), None
+                except Exception as e:
+                    yield path, None, e
+            return
+
+        # results are stored in the order of the paths, only a few
+        # statements are parsed ahead so the memory use stays bounded. The
+        # workers are started as needed, after the writer thread, so they
+        # are spawned rather than forked from a process with threads.
+        with ProcessPoolExecutor(max_workers=self.jobs, initializer=_init_worker,
+                                 initargs=(self.known,),
+                                 mp_context=multiprocessing.get_context('spawn')) as executor:
+            pending = deque()
+            paths = iter(paths)
+            try:
+                for path in paths:
+                    pending.append((path, executor.submit(parse_statement, path, self.options)))
+                    if len(pending) >= self.jobs * 2:
+                        yield self._result(*pending.popleft())
+                while pending:
+                    yield self._result(*pending.popleft())
+            finally:
+                for path, future in pending:
+                    future.cancel()
+
+    def _result(self, path, future):
+        try:
+            return path, future.result(), None
+        except Exception as e:
+            return path, None, e
+
+    def _write(self, q):
+        try:
+            done = False
+            while not done:
+                group = [q.get()]
+                while group[-1] is not None and len(group) < self.group_size:
+                    try:
+                        group.append(q.get_nowait())
+                    except queue.Empty:
+                        break
+                if group[-1] is None:
+                    group.pop()
+                    done = True
+                if group:
+                    self._store(group)
+        finally:
+            # the connection belongs to this thread, don't leave it open
+            connection.close()
+
+    def _store(self, group):
+        results = []
+        try:
+            with transaction.atomic():
+                for parsed in group:
+                    try:
+                        with transaction.atomic():
+                            results.append((parsed.path, self.store(parsed)))
+                    except Exception as e:
+                        self._failed(parsed.path, e)
+        except Exception as e:
+            # the commit failed, nothing of the group was stored
+            for path, result in results:
+                self._failed(path, e)
+            return
+
+        for path, result in results:
+            self.stored += 1
+            if self.on_stored is not None:
+                self.on_stored(path, result)
+
+    def _failed(self, path, error):
+        # parsing failures come from the calling thread, storing ones from the writer
+        with self._lock:
+            self.failed += 1
+        if self.on_failed is not None:
+            self.on_failed(path, error)
@@ -0,0 +1,108 @@
+"""Fingerprints of transactions and the detection of duplicates.
+
+Transactions are matched by the transaction_id read from the statement. When
+it is missing or garbled, a transaction listed by two overlapping statements
+is stored twice. The fingerprint is a hash of the time, amount, description
+and type of a transaction. It is indexed along with the account, so copies
+are found with index lookups instead of comparing transactions pairwise.
+"""
+
+import hashlib
+import re
+from collections import deque, namedtuple
+from datetime import timedelta, timezone
+from decimal import Decimal
+
+CENT = Decimal('0.01')
+
+# transaction ids on the statements are numbers
+ID_PATTERN = re.compile(r'[0-9]+')
+
+def valid_id(transaction_id):
+    """Tells whether `transaction_id` looks like one read from a statement.
+
+    Missing and garbled ids don't, nor the fingerprints used in their place.
+    """
+    return bool(transaction_id) and ID_PATTERN.fullmatch(transaction_id) is not None
+
+def _text(value):
+    return ' '.join((value or '').split()).casefold()
+
+def fingerprint(timestamp, amount, description, type):
+    """Returns the fingerprint of a transaction, 40 hex digits.
+
+    Whitespace and case of the texts don't matter, nor the precision of the
+    amount or the timezone of `timestamp`.
+    """
+    parts = [
+        timestamp.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S'),
+        str(Decimal(amount).quantize(CENT)),
+        _text(description),
+        _text(type),
+    ]
+    return hashlib.sha1('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+def item_fingerprint(item):
+    """Returns the fingerprint of a transaction parsed from a statement."""
+    return fingerprint(item['date'], item['amount'], item['description'], item['type'])
+
+Row = namedtuple('Row', 'pk transaction_id timestamp amount type description fingerprint')
+
+class Duplicate(object):
+    """A transaction looking like a copy of an earlier one.
+
+    `exact` copies have the same fingerprint as the original, the others the
+    same type and amount within a time window. Real transactions can look
+    alike too, e.g. two equal payments in the same minute, a copy is only
+    certain when one of the two has no valid id.
+    """
+
+    def __init__(self, original, copy, exact):
+        self.original = original
+        self.copy = copy
+        self.exact = exact
+
+    @property
+    def removable(self):
+        """The one of the two that can be deleted, or None.
+
+        That is the exact copy without a valid id, preferring the later one.
+        """
+        if not self.exact:
+            return None
+        if not valid_id(self.copy.transaction_id):
+            return self.copy
+        if not valid_id(self.original.transaction_id):
+            return self.original
+        return None
+
+def find_duplicates(account, window=timedelta(minutes=1), model=None):
+    """Yields the Duplicates among the transactions of `account`.
+
+    The transactions are read once, ordered by type, amount and time as the
+    history_tx_account_amount index has them, and every one is compared with
+    the preceding ones of the same type and amount within `window`.
+    """
+    if model is None:
+        from jajan.history.models import Transaction as model
+
+    rows = (model.objects.filter(account=account)
+            .order_by('type', 'amount', 'timestamp', 'pk')
+            .values_list(*Row._fields))
+
+    recent = deque()
+    for row in rows.iterator(chunk_size=5000):
+        row = Row(*row)
+        while recent and (recent[0].type != row.type or recent[0].amount != row.amount
+                          or row.timestamp - recent[0].timestamp > window):
+            recent.popleft()
+
+        for earlier in recent:
+            if earlier.fingerprint == row.fingerprint:
+                yield Duplicate(earlier, row, True)
+                break
+        else:
+            if recent:
+                yield Duplicate(recent[-1], row, False)
+
+        recent.append(row)
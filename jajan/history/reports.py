@@ -0,0 +1,91 @@
+"""Totals of the transactions grouped by category, month, type or currency.
+
+The grouping runs in the database. Ranges made of whole months are read from
+the monthly summaries when possible. Results are cached per user, account,
+grouping and range. Every import bumps a version number of the user that is
+part of the cache keys, which leaves the older entries to expire. The cache
+has to be shared by all the processes, see CACHES in the settings, so that
+imports run by the management commands reach the web server.
+"""
+
+import calendar
+from datetime import datetime, time, timedelta
+
+from django.core.cache import cache
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+
+from jajan.history.models import MonthlySummary, Transaction
+from jajan.history.rollup import MONTH_TZ
+
+GROUPS = ['category', 'month', 'type', 'currency']
+
+# how long results stay cached, imports invalidate them before that
+TIMEOUT = 24 * 60 * 60
+
+def _version_key(user_id):
+    return 'history:reports:version:{}'.format(user_id)
+
+def invalidate(user_id):
+    """Makes the cached reports of the user stale, called after imports."""
+    key = _version_key(user_id)
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # evicted in between
+        cache.set(key, 1, None)
+
+def _whole_months(start, end):
+    if start is not None and start.day != 1:
+        return False
+    if end is not None and end.day != calendar.monthrange(end.year, end.month)[1]:
+        return False
+    return True
+
+def _month(value):
+    return value.strftime('%Y-%m')
+
+def totals(user, by, start=None, end=None, account_id=None):
+    """Returns a list of dicts with the key, count and amount of every group.
+
+    `start` and `end` are inclusive dates in Asia/Jakarta time.
+    """
+    if by not in GROUPS:
+        raise ValueError('unknown grouping {!r}'.format(by))
+
+    if by != 'type' and _whole_months(start, end):
+        qs = MonthlySummary.objects.filter(account__user=user)
+        if account_id is not None:
+            qs = qs.filter(account_id=account_id)
+        if start is not None:
+            qs = qs.filter(month__gte=start)
+        if end is not None:
+            qs = qs.filter(month__lte=end)
+        rows = qs.values(by).annotate(count=Sum('count'), total=Sum('amount')).order_by(by)
+    else:
+        qs = Transaction.objects.filter(account__user=user)
+        if account_id is not None:
+            qs = qs.filter(account_id=account_id)
+        if start is not None:
+            qs = qs.filter(timestamp__gte=datetime.combine(start, time(), MONTH_TZ))
+        if end is not None:
+            qs = qs.filter(timestamp__lt=datetime.combine(end + timedelta(days=1), time(), MONTH_TZ))
+        if by == 'month':
+            qs = qs.annotate(month=TruncMonth('timestamp', tzinfo=MONTH_TZ))
+        rows = qs.values(by).annotate(count=Count('id'), total=Sum('amount')).order_by(by)
+
+    key = _month if by == 'month' else str
+    return [dict(key=key(row[by]), count=row['count'], amount=row['total']) for row in rows]
+
+def cached_totals(user, by, start=None, end=None, account_id=None):
+    """Like totals, from the cache when the user didn't import since."""
+    version = cache.get(_version_key(user.pk), 0)
+    key = 'history:reports:{}:{}:{}:{}:{}:{}'.format(
+        user.pk, account_id or 'all', by, start or '', end or '', version)
+
+    result = cache.get(key)
+    if result is None:
+        result = totals(user, by, start=start, end=end, account_id=account_id)
+        cache.set(key, result, TIMEOUT)
+    return result
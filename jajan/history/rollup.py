@@ -0,0 +1,95 @@
+"""Monthly summaries of the transactions, see MonthlySummary.
+
+Summaries are keyed by (month, category, currency) within an account. The
+importer passes the changes it makes to `update`, `rebuild` recomputes the
+summaries of an account from its transactions, for example after
+transactions were deleted.
+"""
+
+from decimal import Decimal
+from zoneinfo import ZoneInfo
+
+from django.db import transaction
+
+# the timezone of the statements, months start at midnight there
+MONTH_TZ = ZoneInfo('Asia/Jakarta')
+
+def month_of(timestamp):
+    return timestamp.astimezone(MONTH_TZ).date().replace(day=1)
+
+class Changes(object):
+    """Changes of the count and sum of summaries."""
+
+    def __init__(self):
+        self.totals = {}
+
+    def add(self, timestamp, category, currency, amount, count=1):
+        key = (month_of(timestamp), category, currency)
+        total = self.totals.get(key)
+        if total is None:
+            total = self.totals[key] = [0, Decimal(0)]
+        total[0] += count
+        total[1] += Decimal(amount) * count
+
+    def remove(self, timestamp, category, currency, amount):
+        self.add(timestamp, category, currency, amount, count=-1)
+
+def summarize(rows):
+    """Returns the Changes creating the summaries of (timestamp, category, currency, amount) rows."""
+    changes = Changes()
+    for timestamp, category, currency, amount in rows:
+        changes.add(timestamp, category, currency, amount)
+    return changes
+
+def update(account, changes, model=None):
+    """Applies `changes` to the summaries of `account`.
+
+    Must run inside the database transaction that changed the transactions.
+    """
+    if model is None:
+        from jajan.history.models import MonthlySummary as model
+
+    totals = dict((key, total) for key, total in changes.totals.items() if total[0] or total[1])
+    if not totals:
+        return
+
+    months = set(month for month, _, _ in totals)
+    existing = dict(((s.month, s.category, s.currency), s) for s in
+                    model.objects.filter(account=account, month__in=months))
+
+    new = []
+    changed = []
+    empty = []
+    for key, (count, amount) in totals.items():
+        summary = existing.get(key)
+        if summary is None:
+            month, category, currency = key
+            new.append(model(account=account, month=month, category=category, currency=currency,
+                             count=count, amount=amount))
+            continue
+
+        summary.count += count
+        summary.amount += amount
+        if summary.count == 0:
+            empty.append(summary.pk)
+        else:
+            changed.append(summary)
+
+    model.objects.bulk_create(new)
+    if changed:
+        model.objects.bulk_update(changed, ['count', 'amount'])
+    if empty:
+        model.objects.filter(pk__in=empty).delete()
+
+def rebuild(account, transaction_model=None, summary_model=None):
+    """Recomputes the summaries of `account` from its transactions."""
+    if transaction_model is None:
+        from jajan.history.models import Transaction as transaction_model
+    if summary_model is None:
+        from jajan.history.models import MonthlySummary as summary_model
+
+    rows = (transaction_model.objects.filter(account=account)
+            .values_list('timestamp', 'category', 'currency', 'amount'))
+    with transaction.atomic():
+        summary_model.objects.filter(account=account).delete()
+        update(account, summarize(rows.iterator(chunk_size=5000)), model=summary_model)
@@ -0,0 +1,73 @@
+"""Full-text search over the description, note and reference of transactions.
+
+SQLite uses the FTS5 table history_transaction_fts, PostgreSQL a GIN index
+on a tsvector expression, both created by migration 0005. Every word of the
+query has to match the start of a word in the transaction. Other databases
+fall back to icontains filters.
+"""
+
+import re
+
+from django.db import connections
+from django.db.models import BooleanField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+from jajan.history.models import Transaction
+
+FTS_TABLE = 'history_transaction_fts'
+
+# must stay the same as the expression of the index in migration 0005
+TSVECTOR = ("to_tsvector('simple', coalesce({table}.description, '') || ' ' || "
+            "coalesce({table}.note, '') || ' ' || coalesce({table}.reference, ''))")
+
+def words(query):
+    return re.findall(r'\w+', query.lower())
+
+def _sqlite_query(terms):
+    # quoted so that FTS5 operators in the input are taken as text
+    return ' '.join('"{}"*'.format(t) for t in terms)
+
+def _postgresql_query(terms):
+    return ' & '.join('{}:*'.format(t) for t in terms)
+
+def matching(queryset, query, rank=False):
+    """Filters `queryset` to the transactions matching `query`.
+
+    With `rank`, the result gets a 'rank' annotation, higher is better, and
+    is ordered by it.
+    """
+    terms = words(query)
+    if not terms:
+        return queryset.none()
+
+    vendor = connections[queryset.db].vendor
+    table = connections[queryset.db].ops.quote_name(Transaction._meta.db_table)
+
+    if vendor == 'sqlite':
+        q = _sqlite_query(terms)
+        queryset = queryset.filter(RawSQL(
+            '{}.id IN (SELECT rowid FROM {} WHERE {} MATCH %s)'.format(table, FTS_TABLE, FTS_TABLE),
+            [q], output_field=BooleanField()))
+        if rank:
+            # bm25 is lower for better matches
+            queryset = queryset.annotate(rank=RawSQL(
+                '(SELECT -bm25({fts}) FROM {fts} WHERE {fts} MATCH %s AND rowid = {table}.id)'.format(
+                    fts=FTS_TABLE, table=table),
+                [q], output_field=FloatField()))
+    elif vendor == 'postgresql':
+        q = _postgresql_query(terms)
+        vector = TSVECTOR.format(table=table)
+        queryset = queryset.filter(RawSQL(
+            "{} @@ to_tsquery('simple', %s)".format(vector), [q], output_field=BooleanField()))
+        if rank:
+            queryset = queryset.annotate(rank=RawSQL(
+                "ts_rank({}, to_tsquery('simple', %s))".format(vector), [q], output_field=FloatField()))
+    else:
+        for t in terms:
+            queryset = queryset.filter(Q(description__icontains=t) | Q(note__icontains=t) | Q(reference__icontains=t))
+        if rank:
+            queryset = queryset.annotate(rank=Value(0.0, output_field=FloatField()))
+
+    if rank:
+        queryset = queryset.order_by('-rank', '-timestamp', '-pk')
+    return queryset
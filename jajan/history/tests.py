@@ -1,3 +1,261 @@
+import io
+import os
+import tempfile
+from datetime import datetime, timedelta
+from unittest import mock, skipUnless
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
 
-# Create your tests here.
+from jajan.history import reconcile, rollup, search
+from jajan.history.bulkload import PostgresLoader, get_loader
+from jajan.history.importer import import_transactions, new_transaction
+from jajan.history.models import ImportedFile, MonthlySummary, Transaction
+
+from jenius.transaction import synthetic
+from jenius.transaction.parser import TZ
+
+DETAILS = dict(
+    name='Budi',
+    account='Flexi Saver',
+    account_number='90012345678',
+    currency='IDR',
+    cashtag='$budi',
+    card_number='5031 2345 6789 0123',
+)
+
+def item(tid, date=(2020, 9, 30, 12, 5), amount=-5000, description='Parkir Mall', category='Transportasi'):
+    return dict(
+        id=tid,
+        date=TZ.localize(datetime(*date)),
+        description=description,
+        reference=None,
+        note=None,
+        category=category,
+        type='Pembayaran',
+        amount=amount,
+        currency='IDR',
+        transaction_currency='IDR',
+        rate=1,
+    )
+
+class ImportTransactionsTest(TestCase):
+    loader = 'orm'
+
+    def setUp(self):
+        self.user = User.objects.create(username='budi')
+
+    def store(self, transactions):
+        return import_transactions(self.user, DETAILS, transactions, loader=get_loader(name=self.loader))
+
+    def stored(self):
+        return dict(Transaction.objects.values_list('transaction_id', 'category'))
+
+    def summaries(self, account):
+        return sorted(MonthlySummary.objects.filter(account=account)
+                      .values_list('month', 'category', 'currency', 'count', 'amount'))
+
+    def assertSummariesRebuilt(self, account):
+        summaries = self.summaries(account)
+        rollup.rebuild(account)
+        self.assertEqual(summaries, self.summaries(account))
+
+    def test_new_transactions(self):
+        result = self.store([item('111'), item('222', date=(2020, 10, 1, 9, 0), amount=-7000)])
+
+        self.assertTrue(result.account_created)
+        self.assertEqual(result.account.card_number, '5031234567890123')
+        self.assertEqual(result.created, ['111', '222'])
+        self.assertEqual(self.stored(), {'111': 'Transportasi', '222': 'Transportasi'})
+        self.assertEqual(Transaction.objects.get(transaction_id='111').timestamp,
+                         TZ.localize(datetime(2020, 9, 30, 12, 5)))
+        self.assertEqual(self.summaries(result.account)[0][3:], (1, -5000))
+        self.assertSummariesRebuilt(result.account)
+
+    def test_changed_category(self):
+        self.store([item('111'), item('222')])
+        result = self.store([item('111', category='Belanja'), item('222')])
+
+        self.assertFalse(result.account_created)
+        self.assertEqual(result.created, [])
+        self.assertEqual(result.updated, ['111'])
+        self.assertEqual(result.unchanged, ['222'])
+        self.assertEqual(self.stored(), {'111': 'Belanja', '222': 'Transportasi'})
+        self.assertSummariesRebuilt(result.account)
+
+    def test_repeated_ids(self):
+        result = self.store([item('111'), item('111', amount=-9000)])
+        self.assertEqual(result.created, ['111'])
+
+        result = self.store([item('111')])
+        self.assertEqual(result.created, [])
+        self.assertEqual(result.unchanged, ['111'])
+        self.assertEqual(Transaction.objects.count(), 1)
+        self.assertSummariesRebuilt(result.account)
+
+    def test_overlapping_statements_keep_equal_transactions(self):
+        # two equal payments in the same minute have the same fingerprint
+        self.store([item('111')])
+        result = self.store([item('111'), item('222')])
+
+        self.assertEqual(result.created, ['222'])
+        self.assertEqual(result.duplicates, [])
+        self.assertEqual(set(self.stored()), {'111', '222'})
+        self.assertSummariesRebuilt(result.account)
+
+    def test_garbled_id(self):
+        self.store([item('111')])
+        result = self.store([item('1l1'), item('')])
+
+        self.assertEqual(result.created, [])
+        self.assertEqual(len(result.duplicates), 2)
+        self.assertEqual(set(self.stored()), {'111'})
+
+    def test_missing_id(self):
+        result = self.store([item('', description='Tol'), item('', description='Parkir')])
+        self.assertEqual(len(result.created), 2)
+
+        result = self.store([item('', description='Tol')])
+        self.assertEqual(result.created, [])
+        self.assertEqual(len(result.unchanged), 1)
+        self.assertEqual(Transaction.objects.count(), 2)
+
+    def test_summaries_match_rebuild(self):
+        # the first one is in September in UTC, in October in Jakarta
+        self.store([item('111', date=(2020, 10, 1, 0, 30)), item('222', date=(2020, 9, 30, 23, 30)),
+                    item('333', date=(2020, 10, 2, 8, 0), amount=250000, category='Gaji')])
+        result = self.store([item('111', date=(2020, 10, 1, 0, 30), category='Belanja'),
+                             item('444', date=(2020, 11, 1, 0, 0))])
+
+        self.assertEqual([s[0].month for s in self.summaries(result.account)], [9, 10, 10, 11])
+        self.assertSummariesRebuilt(result.account)
+
+class ImportTransactionsNativeTest(ImportTransactionsTest):
+    loader = 'native'
+
+@skipUnless(os.environ.get('JAJAN_DB_ENGINE') == 'postgresql', 'needs PostgreSQL')
+class ImportTransactionsPostgresTest(ImportTransactionsNativeTest):
+    def test_loader(self):
+        self.assertIsInstance(get_loader(name=self.loader), PostgresLoader)
+
+    def test_concurrent_import(self):
+        account = self.store([item('111')]).account
+        loader = get_loader(name=self.loader)
+
+        class ConcurrentLoader(object):
+            def load(self, new, changed):
+                # another import stores one of them, and its summary, first
+                other = item('222', amount=-7000)
+                new_transaction(account, other).save()
+                changes = rollup.Changes()
+                changes.add(other['date'], other['category'], other['currency'], other['amount'])
+                rollup.update(account, changes)
+                return loader.load(new, changed)
+
+        result = import_transactions(self.user, DETAILS, [item('222', amount=-7000), item('333')],
+                                     loader=ConcurrentLoader())
+
+        self.assertEqual(result.created, ['333'])
+        self.assertEqual(result.unchanged, ['222'])
+        self.assertEqual(set(self.stored()), {'111', '222', '333'})
+        self.assertSummariesRebuilt(account)
+
+class WatchTransactionsTest(TestCase):
+    def watch(self, user, path):
+        out = io.StringIO()
+        # keep the connection of the test's transaction open, as the test client does
+        with mock.patch('jajan.history.management.commands.watch_transactions.close_old_connections'):
+            call_command('watch_transactions', user_id=user.pk, dir=path, once=True, poll=True,
+                         settle=0, fast=True, stdout=out)
+        return out.getvalue()
+
+    def test_imported_files_of_each_user(self):
+        budi, ani = User.objects.create(username='budi'), User.objects.create(username='ani')
+        with tempfile.TemporaryDirectory() as path:
+            with open(os.path.join(path, 'a.pdf'), 'wb') as f:
+                synthetic.generate(f, pages=1)
+            with open(os.path.join(path, 'a.pdf'), 'rb') as f, open(os.path.join(path, 'b.pdf'), 'wb') as copy:
+                copy.write(f.read())
+
+            self.assertIn('already imported', self.watch(budi, path))
+            self.assertNotIn('a.pdf', self.watch(budi, path))
+            self.assertIn('stored', self.watch(ani, path))
+
+        self.assertEqual(ImportedFile.objects.filter(user=ani).count(), 2)
+        count = Transaction.objects.filter(account__user=budi).count()
+        self.assertTrue(count)
+        self.assertEqual(Transaction.objects.filter(account__user=ani).count(), count)
+
+class SearchIndexTest(TestCase):
+    def search(self, query):
+        return sorted(search.matching(Transaction.objects.all(), query).values_list('transaction_id', flat=True))
+
+    def test_index_after_migrate(self):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'history_transaction'")
+                self.assertEqual(sorted(name for name, in cursor.fetchall()),
+                                 ['history_transaction_fts_delete', 'history_transaction_fts_insert',
+                                  'history_transaction_fts_update'])
+            elif connection.vendor == 'postgresql':
+                cursor.execute("SELECT indexname FROM pg_indexes WHERE tablename = 'history_transaction'")
+                self.assertIn('history_tx_search', [name for name, in cursor.fetchall()])
+
+    def test_index_follows_writes(self):
+        user = User.objects.create(username='budi')
+        import_transactions(user, DETAILS, [item('111'), item('222', description='Tol Jagorawi')])
+        self.assertEqual(self.search('park'), ['111'])
+
+        Transaction.objects.filter(transaction_id='111').update(description='Kopi')
+        self.assertEqual(self.search('park'), [])
+        self.assertEqual(self.search('kop'), ['111'])
+
+        Transaction.objects.filter(transaction_id='222').delete()
+        self.assertEqual(self.search('tol'), [])
+
+class ReconcileTest(TestCase):
+    def setUp(self):
+        user = User.objects.create(username='budi')
+        self.account = import_transactions(user, DETAILS, [item('111')]).account
+
+    def add(self, *args, **kwargs):
+        # stored directly, the importer skips copies without a valid id
+        tx = new_transaction(self.account, item(*args, **kwargs))
+        tx.save()
+        changes = rollup.Changes()
+        changes.add(tx.timestamp, tx.category, tx.currency, tx.amount)
+        rollup.update(self.account, changes)
+
+    def reconcile(self):
+        out = io.StringIO()
+        call_command('reconcile_transactions', delete=True, stdout=out)
+        return sorted(Transaction.objects.values_list('transaction_id', flat=True))
+
+    def test_equal_transactions_with_valid_ids_are_kept(self):
+        self.add('222')
+
+        duplicates = list(reconcile.find_duplicates(self.account))
+        self.assertEqual(len(duplicates), 1)
+        self.assertTrue(duplicates[0].exact)
+        self.assertIsNone(duplicates[0].removable)
+        self.assertEqual(self.reconcile(), ['111', '222'])
+
+    def test_copy_without_valid_id_is_deleted(self):
+        self.add('1l1')
+
+        duplicates = list(reconcile.find_duplicates(self.account))
+        self.assertEqual([d.removable.transaction_id for d in duplicates], ['1l1'])
+        self.assertEqual(self.reconcile(), ['111'])
+        self.assertEqual(MonthlySummary.objects.get(account=self.account).count, 1)
+
+    def test_window(self):
+        self.add('222', date=(2020, 9, 30, 12, 7), description='Parkir Stasiun')
+
+        self.assertEqual(list(reconcile.find_duplicates(self.account)), [])
+        duplicates = list(reconcile.find_duplicates(self.account, window=timedelta(minutes=5)))
+        self.assertEqual(len(duplicates), 1)
+        self.assertFalse(duplicates[0].exact)
+        self.assertIsNone(duplicates[0].removable)
+        self.assertEqual(self.reconcile(), ['111', '222'])
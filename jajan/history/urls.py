@@ -0,0 +1,14 @@
+from django.urls import path
+
+from . import views
+
+app_name = 'history'
+
+urlpatterns = [
+    path('import/', views.upload, name='upload'),
+    path('import/<str:job_id>/', views.status, name='import-status'),
+    path('totals/<str:by>/', views.totals, name='totals'),
+    path('transactions/', views.transactions, name='transactions'),
+    path('transactions/export/', views.export_transactions, name='export'),
+    path('transactions/search/', views.search_transactions, name='search'),
+]
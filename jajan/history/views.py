@@ -1,3 +1,169 @@
-from django.shortcuts import render
+from datetime import date
 
-# Create your views here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+
+from . import export, reports, search
+from .jobs import QueueFull, UserLimitReached, get_queue
+from .models import Transaction
+
+def _user(request):
+    # the session and user are loaded lazily with synchronous queries
+    return request.user if request.user.is_authenticated else None
+
+def _error(message, status, **headers):
+    response = JsonResponse(dict(error=message), status=status)
+    for name, value in headers.items():
+        response[name.replace('_', '-')] = value
+    return response
+
+async def upload(request):
+    """Accepts a statement in the 'file' field and starts importing it.
+
+    Returns the job right away with status 202, its progress is available
+    from the status view.
+    """
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+
+    user = await sync_to_async(_user)(request)
+    if user is None:
+        return _error('authentication required', 401)
+
+    files = await sync_to_async(lambda: request.FILES)()
+    f = files.get('file')
+    if f is None:
+        return _error('missing file', 400)
+    if f.size > getattr(settings, 'IMPORT_MAX_SIZE', 20 * 1024 * 1024):
+        return _error('file too large', 413)
+
+    data = await sync_to_async(f.read)()
+    try:
+        job = get_queue().submit(user.pk, f.name, data)
+    except UserLimitReached:
+        return _error('too many imports running', 429, Retry_After='10')
+    except QueueFull:
+        return _error('the server is busy', 503, Retry_After='30')
+
+    response = JsonResponse(job.to_dict(), status=202)
+    response['Location'] = reverse('history:import-status', args=[job.id])
+    return response
+
+async def status(request, job_id):
+    """Returns the state and progress of an import job."""
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+
+    user = await sync_to_async(_user)(request)
+    if user is None:
+        return _error('authentication required', 401)
+
+    job = get_queue().get(job_id)
+    if job is None or job.user_id != user.pk:
+        raise Http404()
+    return JsonResponse(job.to_dict())
+
+def totals(request, by):
+    """Returns the count and sum of the transactions grouped by `by`.
+
+    The optional 'start' and 'end' parameters are inclusive YYYY-MM-DD dates,
+    'account' limits the totals to one of the user's accounts.
+    """
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    if not request.user.is_authenticated:
+        return _error('authentication required', 401)
+    if by not in reports.GROUPS:
+        raise Http404()
+
+    try:
+        start = request.GET.get('start')
+        start = date.fromisoformat(start) if start else None
+        end = request.GET.get('end')
+        end = date.fromisoformat(end) if end else None
+        account_id = request.GET.get('account')
+        account_id = int(account_id) if account_id else None
+    except ValueError:
+        return _error('invalid start, end or account', 400)
+
+    rows = reports.cached_totals(request.user, by, start=start, end=end, account_id=account_id)
+    return JsonResponse(dict(by=by, start=start, end=end, account=account_id, totals=rows))
+
+def _transactions(request):
+    """Returns the user's transactions, of one account with the 'account' parameter."""
+    qs = Transaction.objects.filter(account__user=request.user)
+    account_id = request.GET.get('account')
+    if account_id:
+        qs = qs.filter(account_id=int(account_id))
+    return qs
+
+def transactions(request):
+    """Lists the transactions, newest first.
+
+    'limit' sets the page size, up to 500. The response has a 'next' cursor
+    when there are more transactions, pass it as the 'cursor' parameter to
+    get the next page.
+    """
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    if not request.user.is_authenticated:
+        return _error('authentication required', 401)
+
+    try:
+        qs = _transactions(request)
+        limit = min(max(int(request.GET.get('limit', 100)), 1), 500)
+        rows, following = export.page(qs, limit, cursor=request.GET.get('cursor') or None)
+    except ValueError:
+        return _error('invalid account, limit or cursor', 400)
+
+    return JsonResponse(dict(transactions=rows, next=following))
+
+def search_transactions(request):
+    """Returns the transactions whose description, note or reference match 'q', best first.
+
+    Every word of 'q' matches the words starting with it. 'limit' sets the
+    number of results, up to 200.
+    """
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    if not request.user.is_authenticated:
+        return _error('authentication required', 401)
+
+    try:
+        qs = _transactions(request)
+        limit = min(max(int(request.GET.get('limit', 50)), 1), 200)
+    except ValueError:
+        return _error('invalid account or limit', 400)
+
+    qs = search.matching(qs, request.GET.get('q', ''), rank=True)
+    rows = [export.to_dict(row) for row in export.values(qs)[:limit]]
+    return JsonResponse(dict(transactions=rows))
+
+def export_transactions(request):
+    """Downloads all the transactions as CSV, or JSON lines with format=jsonl."""
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    if not request.user.is_authenticated:
+        return _error('authentication required', 401)
+
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in ('csv', 'jsonl'):
+        return _error('format must be csv or jsonl', 400)
+    try:
+        qs = _transactions(request).order_by('timestamp', 'pk')
+    except ValueError:
+        return _error('invalid account', 400)
+
+    if fmt == 'csv':
+        content, content_type = export.csv_lines(qs), 'text/csv; charset=utf-8'
+    else:
+        content, content_type = export.json_lines(qs), 'application/x-ndjson'
+    if isinstance(request, ASGIRequest):
+        content = export.aiterate(content)
+
+    response = StreamingHttpResponse(content, content_type=content_type)
+    response['Content-Disposition'] = 'attachment; filename="transactions.{}"'.format(fmt)
+    return response
@@ -0,0 +1,119 @@
+"""Notices new and changed files in a directory.
+
+InotifyWatcher uses Linux inotify through ctypes, PollingWatcher compares
+directory listings and works everywhere. Both return the paths that may have
+changed, the caller decides when a file is complete.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import time
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+
+_event = struct.Struct('iIII')
+
+def list_files(path):
+    """Returns a dict of the files in `path` to their (size, mtime)."""
+    files = {}
+    try:
+        entries = os.scandir(path)
+    except FileNotFoundError:
+        return files
+    with entries:
+        for entry in entries:
+            try:
+                if entry.is_file():
+                    st = entry.stat()
+                    files[entry.path] = (st.st_size, st.st_mtime)
+            except FileNotFoundError:
+                continue
+    return files
+
+class PollingWatcher(object):
+    def __init__(self, path, interval=2.0):
+        self.path = path
+        self.interval = interval
+        self._files = list_files(path)
+
+    def initial(self):
+        return list(self._files)
+
+    def wait(self, timeout):
+        """Returns the paths changed within `timeout` seconds."""
+        time.sleep(min(timeout, self.interval))
+        files = list_files(self.path)
+        changed = [p for p, stat in files.items() if self._files.get(p) != stat]
+        self._files = files
+        return changed
+
+    def close(self):
+        pass
+
+class InotifyWatcher(object):
+    mask = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_MODIFY
+
+    def __init__(self, path):
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.path = path
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            e = ctypes.get_errno()
+            raise OSError(e, os.strerror(e))
+        if libc.inotify_add_watch(self.fd, os.fsencode(path), self.mask) < 0:
+            e = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(e, os.strerror(e), path)
+
+    def initial(self):
+        return list(list_files(self.path))
+
+    def wait(self, timeout):
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+
+        try:
+            buf = os.read(self.fd, 64 * 1024)
+        except OSError as e:
+            if e.errno == errno.EAGAIN:
+                return []
+            raise
+
+        changed = set()
+        offset = 0
+        while offset < len(buf):
+            wd, mask, cookie, length = _event.unpack_from(buf, offset)
+            offset += _event.size
+            name = buf[offset:offset + length].rstrip(b'\0')
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                # events were dropped, look at everything again
+                changed.update(list_files(self.path))
+            elif name:
+                changed.add(os.path.join(self.path, os.fsdecode(name)))
+        return list(changed)
+
+    def close(self):
+        os.close(self.fd)
+
+def watcher(path, polling=False, interval=2.0):
+    """Returns an InotifyWatcher for `path` when possible, a PollingWatcher otherwise."""
+    if not polling and hasattr(os, 'O_CLOEXEC'):
+        try:
+            return InotifyWatcher(path)
+        except (OSError, AttributeError, TypeError):
+            # no inotify: not Linux, or out of watches
+            pass
+    return PollingWatcher(path, interval=interval)
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -75,13 +76,41 @@ WSGI_APPLICATION = 'jajan.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.1/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# SQLite by default, set JAJAN_DB_ENGINE=postgresql and the other JAJAN_DB_*
+# variables to use PostgreSQL instead.
+if os.environ.get('JAJAN_DB_ENGINE') == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('JAJAN_DB_NAME', 'jajan'),
+            'USER': os.environ.get('JAJAN_DB_USER', ''),
+            'PASSWORD': os.environ.get('JAJAN_DB_PASSWORD', ''),
+            'HOST': os.environ.get('JAJAN_DB_HOST', ''),
+            'PORT': os.environ.get('JAJAN_DB_PORT', ''),
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('JAJAN_DB_NAME', BASE_DIR / 'db.sqlite3'),
+        }
     }
+
+# Run on every new SQLite connection. WAL lets readers work during imports
+# and NORMAL only syncs at checkpoints, which is safe with WAL.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'temp_store': 'MEMORY',
+    'cache_size': -64 * 1024,
 }
 
+# How imports write transactions: 'native' uses COPY on PostgreSQL and
+# executemany on SQLite, 'orm' uses bulk_create and bulk_update.
+HISTORY_BULK_LOADER = 'native'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
@@ -120,3 +149,31 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/3.1/howto/static-files/
 
 STATIC_URL = '/static/'
+
+
+# Cache shared by the web server and the management commands, imports
+# invalidate the cached reports through it
+# https://docs.djangoproject.com/en/3.1/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / '.cache' / 'django',
+    }
+}
+
+
+# Parsed statements cache used by the import_transaction command
+
+PARSER_CACHE_DIR = BASE_DIR / '.cache' / 'parser'
+
+PARSER_CACHE_SIZE = 256 * 1024 * 1024
+
+# Uploaded statements are imported in the background by IMPORT_WORKERS
+# threads, with at most IMPORT_BACKLOG more waiting. IMPORT_PARSE_WORKERS
+# processes parse the uploads, 0 parses them in the threads.
+IMPORT_WORKERS = 2
+IMPORT_BACKLOG = 8
+IMPORT_JOBS_PER_USER = 2
+IMPORT_PARSE_WORKERS = 2
+IMPORT_MAX_SIZE = 20 * 1024 * 1024
@@ -0,0 +1,157 @@
+"""Parser benchmark on synthetic statements.
+
+Generates statements of the requested sizes with jenius.transaction.synthetic,
+parses each of them in a fresh process and reports the throughput, the peak
+memory and the time spent in every parser stage:
+
+    python -m jenius.transaction.benchmark --pages 1 10 100 1000
+
+Results can be saved with --save and compared against a previous run with
+--compare, the exit status is 1 when a size got slower than the tolerance.
+"""
+
+import argparse
+import io
+import json
+import multiprocessing
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from jenius.transaction import synthetic
+from jenius.transaction.parser import Parser
+from jenius.transaction.stats import ParserStats
+
+STAGES = [
+    'interpret',
+    'collect',
+    'sort',
+    'table_boundaries',
+    'find_content',
+    'find_columns',
+    'find_rows',
+    'read_transactions',
+    'find_details',
+]
+
+def _peak_rss():
+    """Returns the peak resident set size of this process and its children in bytes."""
+    usage = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    if sys.platform == 'darwin':
+        return usage
+    return usage * 1024
+
+def _run(data, expected, fast, workers):
+    parser = Parser(fast=fast, stats=ParserStats())
+
+    start = time.perf_counter()
+    cpu = time.process_time()
+    result = parser.parse(io.BytesIO(data), workers=workers)
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - cpu
+
+    return dict(
+        seconds=elapsed,
+        cpu=cpu,
+        transactions=len(result.transactions),
+        correct=(result.details, result.transactions) == expected,
+        peak_rss=_peak_rss(),
+        stages=dict((name, s['wall']) for name, s in result.stats.summary().items()),
+    )
+
+def benchmark(pages, fast=False, workers=None, repeat=1, seed=0):
+    f = io.BytesIO()
+    expected = synthetic.generate(f, pages=pages, seed=seed)
+    data = f.getvalue()
+
+    best = None
+    ctx = multiprocessing.get_context('spawn')
+    for i in range(repeat):
+        # a fresh process for every run keeps the peak RSS meaningful
+        with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as executor:
+            result = executor.submit(_run, data, expected, fast, workers).result()
+        if best is None or result['seconds'] < best['seconds']:
+            best = result
+
+    best['pages'] = pages
+    best['size'] = len(data)
+    best['pages_per_second'] = pages / best['seconds']
+    best['transactions_per_second'] = best['transactions'] / best['seconds']
+    return best
+
+def report(results, out=sys.stdout):
+    out.write('{:>6} {:>7} {:>9} {:>9} {:>9} {:>9} {:>8} {:>7}\n'.format(
+        'pages', 'txs', 'seconds', 'cpu', 'pages/s', 'txs/s', 'rss MB', 'check'))
+    for r in results:
+        out.write('{:>6} {:>7} {:>9.3f} {:>9.3f} {:>9.1f} {:>9.1f} {:>8.1f} {:>7}\n'.format(
+            r['pages'], r['transactions'], r['seconds'], r['cpu'],
+            r['pages_per_second'], r['transactions_per_second'],
+            r['peak_rss'] / 1024 / 1024, 'ok' if r['correct'] else 'FAILED'))
+
+    staged = [r for r in results if r['stages']]
+    if not staged:
+        return
+
+    out.write('\nper-stage seconds\n')
+    out.write('{:<24}'.format('stage') + ''.join('{:>10}'.format(r['pages']) for r in staged) + '\n')
+    for stage in STAGES:
+        out.write('{:<24}'.format(stage))
+        out.write(''.join('{:>10.3f}'.format(r['stages'].get(stage, 0.0)) for r in staged) + '\n')
+
+def compare(results, baseline, tolerance, out=sys.stdout):
+    """Reports the sizes that got slower than the baseline, returns whether any did."""
+    previous = dict((r['pages'], r) for r in baseline)
+
+    regressed = False
+    for r in results:
+        old = previous.get(r['pages'])
+        if old is None:
+            continue
+
+        change = r['pages_per_second'] / old['pages_per_second'] - 1
+        status = 'ok'
+        if change < -tolerance:
+            status = 'REGRESSION'
+            regressed = True
+        out.write('{:>6} pages: {:>9.1f} -> {:>9.1f} pages/s ({:+.1%}) {}\n'.format(
+            r['pages'], old['pages_per_second'], r['pages_per_second'], change, status))
+
+    return regressed
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='Benchmarks the parser on synthetic statements.')
+    ap.add_argument('--pages', type=int, nargs='+', default=[1, 10, 100, 1000])
+    ap.add_argument('--fast', action='store_true', help='use the fast extraction mode')
+    ap.add_argument('--workers', type=int, default=None)
+    ap.add_argument('--repeat', type=int, default=1, help='runs per size, the best one is reported')
+    ap.add_argument('--seed', type=int, default=0)
+    ap.add_argument('--save', help='write the results to this JSON file')
+    ap.add_argument('--compare', help='JSON file of a previous run to compare against')
+    ap.add_argument('--tolerance', type=float, default=0.1,
+                    help='allowed slowdown against --compare, default 0.1')
+    args = ap.parse_args(argv)
+
+    results = []
+    for pages in args.pages:
+        results.append(benchmark(pages, fast=args.fast, workers=args.workers,
+                                 repeat=args.repeat, seed=args.seed))
+
+    report(results)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    failed = not all(r['correct'] for r in results)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        sys.stdout.write('\n')
+        failed = compare(results, baseline, args.tolerance) or failed
+
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
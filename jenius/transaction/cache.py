@@ -0,0 +1,99 @@
+import hashlib
+import os
+import pickle
+import tempfile
+
+class ParseCache(object):
+    """On-disk cache of parsed statements.
+
+    Entries are keyed by the SHA-256 of the PDF bytes and the parser version,
+    and hold the pickled details and transactions. When the total size goes
+    over `max_size` bytes the least recently used entries are removed; reading
+    an entry refreshes its modification time.
+    """
+
+    suffix = '.pickle'
+
+    def __init__(self, path, max_size=256 * 1024 * 1024):
+        self.path = str(path)
+        self.max_size = max_size
+
+    def key(self, data, version):
+        h = hashlib.sha256()
+        h.update(str(version).encode('utf-8'))
+        h.update(b'\0')
+        h.update(data)
+        return h.hexdigest()
+
+    def _filename(self, key):
+        return os.path.join(self.path, key[:2], key + self.suffix)
+
+    def get(self, key):
+        """Returns the cached (details, transactions), or None."""
+        filename = self._filename(key)
+        try:
+            with open(filename, 'rb') as f:
+                details, transactions = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except (EOFError, pickle.UnpicklingError, ValueError):
+            self._remove(filename)
+            return None
+
+        try:
+            os.utime(filename)
+        except FileNotFoundError:
+            pass
+
+        return details, transactions
+
+    def put(self, key, details, transactions):
+        filename = self._filename(key)
+        dirname = os.path.dirname(filename)
+        os.makedirs(dirname, exist_ok=True)
+
+        # write to a temporary file first so readers never see partial entries
+        fd, tmp = tempfile.mkstemp(dir=dirname, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump((details, transactions), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, filename)
+        except BaseException:
+            self._remove(tmp)
+            raise
+
+        self.evict()
+
+    def evict(self):
+        entries = []
+        total = 0
+        for dirpath, dirnames, filenames in os.walk(self.path):
+            for name in filenames:
+                if not name.endswith(self.suffix):
+                    continue
+                filename = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(filename)
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, filename))
+                total += st.st_size
+
+        entries.sort()
+        for mtime, size, filename in entries:
+            if total <= self.max_size:
+                break
+            self._remove(filename)
+            total -= size
+
+    def clear(self):
+        for dirpath, dirnames, filenames in os.walk(self.path):
+            for name in filenames:
+                if name.endswith(self.suffix):
+                    self._remove(os.path.join(dirpath, name))
+
+    def _remove(self, filename):
+        try:
+            os.remove(filename)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,272 @@
+"""Parses statements into JSON lines.
+
+    python -m jenius.transaction.cli statements/ 2021-*.pdf -o transactions.jsonl
+
+Files and directories can be given, directories are searched for PDF files.
+The files are parsed in a pool of processes and every transaction is written
+as one JSON object as soon as its page is done, so the lines of different
+files are interleaved. Every line has the file and the account number besides
+the transaction fields.
+
+A file that can't be parsed is reported on stderr and the others go on, the
+exit status is 1 when any file failed. Its transactions read before the
+failure were already written. Progress and throughput go to stderr.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from jenius.transaction.cache import ParseCache
+from jenius.transaction.parser import Parser, ParsingContext
+from jenius.transaction.stats import ParserStats
+
+def find_files(paths):
+    """Yields the given files and the PDF files found in the given directories."""
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+
+        for dirpath, dirnames, filenames in os.walk(path):
+            dirnames.sort()
+            for name in sorted(filenames):
+                if name.lower().endswith('.pdf'):
+                    yield os.path.join(dirpath, name)
+
+def _default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError('{!r} is not JSON serializable'.format(value))
+
+def to_json(path, details, tx):
+    line = dict(file=path, account_number=details.get('account_number') if details else None)
+    line.update(tx)
+    return json.dumps(line, default=_default, ensure_ascii=False)
+
+_contexts = {}
+
+def _parser(options, workers, path=None):
+    # keep one context per process, the pdfminer objects are reused
+    fast = options['fast']
+    if workers is None and fast not in _contexts:
+        _contexts[fast] = ParsingContext(fast=fast)
+
+    cache = None
+    if options['cache']:
+        cache = ParseCache(options['cache'])
+    stats = None
+    if options['profile']:
+        stats = ParserStats(memory=options['memory'], statement=path)
+    return Parser(fast=fast, cache=cache, context=_contexts.get(fast), stats=stats)
+
+def parse_file(index, path, options, emit, workers=None):
+    """Parses one file, passing its messages to `emit`.
+
+    A ('page', index, lines) message is emitted for every page and the file
+    ends with ('done', index, stats records) or ('failed', index, error).
+    """
+    parser = _parser(options, workers, path)
+    try:
+        with open(path, 'rb') as f:
+            details = None
+            for d, transactions in parser.iter_pages(f, workers=workers):
+                details = parser._merge_details(details, d)
+                lines = [to_json(path, details, tx) for tx in transactions]
+                emit(('page', index, lines))
+    except BrokenPipeError:
+        raise
+    except Exception as e:
+        emit(('failed', index, '{}: {}'.format(type(e).__name__, e)))
+        return
+
+    records = parser.stats.records if parser.stats is not None else None
+    emit(('done', index, records))
+
+_queue = None
+
+def _init_worker(q):
+    global _queue
+    _queue = q
+
+def _parse_file_worker(index, path, options):
+    parse_file(index, path, options, _queue.put)
+
+class Progress(object):
+    """Counts the pages and transactions written and reports the throughput."""
+
+    def __init__(self, total, out=sys.stderr, interval=1.0):
+        self.total = total
+        self.out = out
+        self.interval = interval
+        self.tty = out.isatty()
+        self.files = 0
+        self.failed = 0
+        self.pages = 0
+        self.transactions = 0
+        self.start = time.perf_counter()
+        self._last = self.start
+
+    def page(self, count):
+        self.pages += 1
+        self.transactions += count
+        now = time.perf_counter()
+        if self.tty and now - self._last >= self.interval:
+            self._last = now
+            self.out.write('\r' + self._line(now))
+            self.out.flush()
+
+    def done(self, failed=False):
+        self.files += 1
+        if failed:
+            self.failed += 1
+
+    def _line(self, now):
+        elapsed = max(now - self.start, 1e-9)
+        return '{}/{} files, {} pages, {} transactions, {:.1f} pages/s, {:.1f} transactions/s'.format(
+            self.files, self.total, self.pages, self.transactions,
+            self.pages / elapsed, self.transactions / elapsed)
+
+    def error(self, path, message):
+        if self.tty:
+            self.out.write('\r\033[K')
+        self.out.write('{}: {}\n'.format(path, message))
+
+    def summary(self):
+        now = time.perf_counter()
+        if self.tty:
+            self.out.write('\r\033[K')
+        self.out.write('{} in {:.2f}s'.format(self._line(now), now - self.start))
+        if self.failed:
+            self.out.write(', {} failed'.format(self.failed))
+        self.out.write('\n')
+
+class Runner(object):
+    """Writes the messages of parse_file and keeps track of the files."""
+
+    def __init__(self, files, out, progress, stats=None):
+        self.files = files
+        self.out = out
+        self.progress = progress
+        self.stats = stats
+        self.remaining = set(range(len(files)))
+        self.failed = 0
+
+    def handle(self, message):
+        kind, index, value = message
+        if kind == 'page':
+            if value:
+                self.out.write('\n'.join(value) + '\n')
+                self.out.flush()
+            if self.progress is not None:
+                self.progress.page(len(value))
+            return
+
+        self.remaining.discard(index)
+        if kind == 'done':
+            if value and self.stats is not None:
+                self.stats.extend(value)
+        else:
+            self.failed += 1
+            self.error(index, value)
+        if self.progress is not None:
+            self.progress.done(failed=kind == 'failed')
+
+    def error(self, index, message):
+        if self.progress is not None:
+            self.progress.error(self.files[index], message)
+        else:
+            sys.stderr.write('{}: {}\n'.format(self.files[index], message))
+
+    def run(self, options, jobs):
+        if jobs <= 1 or len(self.files) == 1:
+            # a single file can still be split among processes by pages
+            workers = jobs if jobs > 1 else None
+            for index, path in enumerate(self.files):
+                parse_file(index, path, options, self.handle, workers=workers)
+            return
+
+        # the queue is bounded so that workers wait for a slow consumer
+        q = multiprocessing.Queue(jobs * 4)
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(q,)) as executor:
+            futures = dict((executor.submit(_parse_file_worker, index, path, options), index)
+                           for index, path in enumerate(self.files))
+            try:
+                while self.remaining:
+                    try:
+                        message = q.get(timeout=0.2)
+                    except queue.Empty:
+                        self._check_crashed(futures)
+                        continue
+                    self.handle(message)
+            finally:
+                for future in futures:
+                    future.cancel()
+                # running workers may be blocked on the full queue
+                while not all(future.done() for future in futures):
+                    try:
+                        q.get(timeout=0.2)
+                    except queue.Empty:
+                        pass
+
+    def _check_crashed(self, futures):
+        # a worker that dies never reports back, its future has the error
+        for future, index in futures.items():
+            if index not in self.remaining or not future.done() or future.cancelled():
+                continue
+            e = future.exception()
+            if e is not None:
+                self.handle(('failed', index, '{}: {}'.format(type(e).__name__, e)))
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='Parses Jenius statements into JSON lines.')
+    ap.add_argument('paths', nargs='+', help='statement files or directories')
+    ap.add_argument('-o', '--output', help='write to this file instead of stdout')
+    ap.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                    help='number of processes, default the number of CPUs')
+    ap.add_argument('--fast', action='store_true', help='use the fast extraction mode')
+    ap.add_argument('--cache', help='directory of the parse cache')
+    ap.add_argument('-q', '--quiet', action='store_true', help='only report failures')
+    ap.add_argument('--profile', action='store_true', help='print the time spent in every stage')
+    ap.add_argument('--profile-memory', action='store_true', help='also trace allocations, slower')
+    args = ap.parse_args(argv)
+
+    files = list(find_files(args.paths))
+    options = dict(fast=args.fast, cache=args.cache,
+                   profile=args.profile or args.profile_memory,
+                   memory=args.profile_memory)
+
+    stats = ParserStats() if options['profile'] else None
+    progress = None if args.quiet else Progress(len(files))
+
+    out = sys.stdout
+    if args.output:
+        out = open(args.output, 'w', encoding='utf-8')
+
+    runner = Runner(files, out, progress, stats=stats)
+    try:
+        runner.run(options, args.jobs)
+    except BrokenPipeError:
+        # the reader went away, e.g. head. Point stdout to /dev/null so that
+        # flushing it at exit doesn't fail again.
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 1
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    if progress is not None:
+        progress.summary()
+    if stats is not None:
+        stats.report()
+
+    return 1 if runner.failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,227 @@
+"""Column oriented storage for parsed transactions.
+
+Parsed transactions are dicts holding datetimes and ints, which takes a few
+hundred bytes per transaction. ColumnarData keeps every field in its own
+column: amounts, rates and epoch timestamps in typed arrays, and repeated
+strings such as the category, type and currencies dictionary-encoded. Rows
+are still available as the familiar dicts, and sums and group-bys run over
+the arrays, with NumPy when it is installed.
+"""
+
+from array import array
+from datetime import datetime
+from itertools import compress
+
+from jenius.transaction.parser import TZ
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class StringColumn(object):
+    """Dictionary-encoded column of strings, None is allowed."""
+
+    def __init__(self):
+        self.values = []
+        self.codes = array('I')
+        self._index = {}
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, i):
+        return self.values[self.codes[i]]
+
+    def encode(self, value):
+        code = self._index.get(value)
+        if code is None:
+            code = self._index[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def append(self, value):
+        self.codes.append(self.encode(value))
+
+    def code(self, value):
+        """Returns the code of `value`, or None when it doesn't occur."""
+        return self._index.get(value)
+
+
+class ColumnarData(object):
+    """Transactions of one or more statements, stored column by column.
+
+    Indexing returns the transaction as a dict with the same keys as
+    Parser.parse. Dates come back in Asia/Jakarta, like the parsed ones.
+    """
+
+    int_fields = ['amount', 'rate']
+    encoded_fields = ['description', 'category', 'type', 'currency', 'transaction_currency']
+    text_fields = ['id', 'reference', 'note']
+
+    def __init__(self, details=None):
+        self.details = details
+        self.timestamps = array('q')
+        for name in self.int_fields:
+            setattr(self, name, array('q'))
+        for name in self.encoded_fields:
+            setattr(self, name, StringColumn())
+        for name in self.text_fields:
+            setattr(self, name, [])
+
+    @classmethod
+    def from_data(cls, data):
+        columnar = cls(data.details)
+        columnar.extend(data.transactions)
+        return columnar
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+
+        row = dict(date=datetime.fromtimestamp(self.timestamps[i], TZ))
+        for name in self.int_fields:
+            row[name] = getattr(self, name)[i]
+        for name in self.encoded_fields + self.text_fields:
+            row[name] = getattr(self, name)[i]
+        return row
+
+    def append(self, tx):
+        self.timestamps.append(int(tx['date'].timestamp()))
+        for name in self.int_fields:
+            getattr(self, name).append(tx[name])
+        for name in self.encoded_fields:
+            getattr(self, name).append(tx[name])
+        for name in self.text_fields:
+            getattr(self, name).append(tx[name])
+
+    def extend(self, transactions):
+        for tx in transactions:
+            self.append(tx)
+
+    def _mask(self, where):
+        """Returns booleans selecting the rows matching `where`.
+
+        `where` maps encoded field names to a value, rows must match all of
+        them. The result is a NumPy array when NumPy is installed, a list
+        otherwise, and None when there is nothing to filter on.
+        """
+        if not where:
+            return None
+
+        mask = None
+        for name, value in where.items():
+            if name not in self.encoded_fields:
+                raise ValueError('can only filter on {}'.format(', '.join(self.encoded_fields)))
+
+            column = getattr(self, name)
+            code = column.code(value)
+            if code is None:
+                if numpy is not None:
+                    return numpy.zeros(len(self), dtype=bool)
+                return [False] * len(self)
+
+            if numpy is not None:
+                m = numpy.frombuffer(column.codes, dtype=numpy.uint32) == code
+                mask = m if mask is None else mask & m
+            else:
+                m = [c == code for c in column.codes]
+                mask = m if mask is None else [a and b for a, b in zip(mask, m)]
+
+        return mask
+
+    def sum(self, field='amount', where=None):
+        """Sums an integer column over the rows matching `where`."""
+        values = getattr(self, field)
+        mask = self._mask(where)
+
+        if numpy is not None:
+            arr = numpy.frombuffer(values, dtype=numpy.int64)
+            if mask is not None:
+                arr = arr[mask]
+            return int(arr.sum())
+
+        if mask is not None:
+            return sum(compress(values, mask))
+        return sum(values)
+
+    def months(self):
+        """Returns a StringColumn of the 'YYYY-MM' month of every row."""
+        column = StringColumn()
+        cache = {}
+        for ts in self.timestamps:
+            # an hour never spans two months in Asia/Jakarta
+            hour = ts // 3600
+            month = cache.get(hour)
+            if month is None:
+                month = cache[hour] = datetime.fromtimestamp(ts, TZ).strftime('%Y-%m')
+            column.append(month)
+        return column
+
+    def group_by(self, key, field='amount', where=None):
+        """Returns a dict of `key` value to the (count, sum of `field`) of its rows.
+
+        `key` is one of the encoded fields or 'month'.
+        """
+        if key == 'month':
+            column = self.months()
+        elif key in self.encoded_fields:
+            column = getattr(self, key)
+        else:
+            raise ValueError('can only group by month, {}'.format(', '.join(self.encoded_fields)))
+
+        values = getattr(self, field)
+        mask = self._mask(where)
+        n = len(column.values)
+
+        if numpy is not None:
+            codes = numpy.frombuffer(column.codes, dtype=numpy.uint32)
+            arr = numpy.frombuffer(values, dtype=numpy.int64)
+            if mask is not None:
+                codes = codes[mask]
+                arr = arr[mask]
+            counts = numpy.bincount(codes, minlength=n).tolist()
+            # bincount would sum in float64, keep the amounts exact
+            sums = numpy.zeros(n, dtype=numpy.int64)
+            numpy.add.at(sums, codes, arr)
+            sums = sums.tolist()
+        else:
+            counts = [0] * n
+            sums = [0] * n
+            codes = column.codes
+            if mask is not None:
+                codes = compress(codes, mask)
+                values = compress(values, mask)
+            for code, value in zip(codes, values):
+                counts[code] += 1
+                sums[code] += value
+
+        return dict((column.values[code], (counts[code], sums[code]))
+                    for code in range(n) if counts[code])
+
+    def to_numpy(self):
+        """Returns the rows as a NumPy structured array, strings as codes."""
+        if numpy is None:
+            raise RuntimeError('NumPy is not installed')
+
+        dtype = [('timestamp', 'i8')]
+        dtype += [(name, 'i8') for name in self.int_fields]
+        dtype += [(name, 'u4') for name in self.encoded_fields]
+
+        result = numpy.empty(len(self), dtype=dtype)
+        result['timestamp'] = numpy.frombuffer(self.timestamps, dtype=numpy.int64)
+        for name in self.int_fields:
+            result[name] = numpy.frombuffer(getattr(self, name), dtype=numpy.int64)
+        for name in self.encoded_fields:
+            result[name] = numpy.frombuffer(getattr(self, name).codes, dtype=numpy.uint32)
+        return result
@@ -1,17 +1,90 @@
 import io
 import re
-from collections import defaultdict
+from bisect import bisect_left, bisect_right
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
 from datetime import datetime
-from functools import cmp_to_key
 
 import pytz
 from pdfminer.converter import PDFConverter
 from pdfminer.layout import LAParams, LTPage, LTCurve, LTFigure, LTImage, LTTextLine, LTTextBox, LTChar, LTText, LTTextGroup
+from pdfminer.pdfdocument import PDFDocument
 from pdfminer.pdfinterp import PDFResourceManager, PDFPageInterpreter
 from pdfminer.pdfpage import PDFPage
+from pdfminer.pdfparser import PDFParser
 
 TZ = pytz.timezone('Asia/Jakarta')
 
+# bump whenever the parsed output changes, it invalidates cached results
+PARSER_VERSION = 2
+
+class TextSpans(object):
+    """Text spans of a page, stored as parallel lists.
+
+    While a page is being collected the text of every span is kept as a list
+    of fragments. `join` turns them into strings once the page is done.
+    """
+
+    __slots__ = ('xs', 'ys', 'ws', 'hs', 'texts', 'bbox', '_fragments')
+
+    def __init__(self):
+        self.bbox = None
+        self.xs = []
+        self.ys = []
+        self.ws = []
+        self.hs = []
+        self.texts = None
+        self._fragments = []
+
+    def __len__(self):
+        return len(self.xs)
+
+    def add(self, x, y, w, h):
+        """Starts a new span, returns the list its fragments go into."""
+        self.xs.append(x)
+        self.ys.append(y)
+        self.ws.append(w)
+        self.hs.append(h)
+
+        fragments = []
+        self._fragments.append(fragments)
+        return fragments
+
+    def join(self):
+        self.texts = [''.join(f) for f in self._fragments]
+        self._fragments = None
+        return self
+
+    def position(self, idx):
+        return self.xs[idx], self.ys[idx], self.ws[idx], self.hs[idx]
+
+    def between(self, ymin, ymax):
+        """Returns the indexes of the spans with ymin <= y < ymax.
+
+        Only valid on spans returned by `sorted`.
+        """
+        return range(bisect_left(self.ys, ymin), bisect_left(self.ys, ymax))
+
+    def above(self, ymax):
+        """Returns the indexes of the spans with y < ymax."""
+        return range(bisect_left(self.ys, ymax))
+
+    def sorted(self):
+        """Returns a copy ordered by position, top to bottom, left to right."""
+        xs = self.xs
+        ys = self.ys
+        order = sorted(range(len(xs)), key=lambda i: (ys[i], xs[i]))
+
+        spans = TextSpans()
+        spans.bbox = self.bbox
+        spans.xs = [xs[i] for i in order]
+        spans.ys = [ys[i] for i in order]
+        spans.ws = [self.ws[i] for i in order]
+        spans.hs = [self.hs[i] for i in order]
+        spans.texts = [self.texts[i] for i in order]
+        return spans
+
 class Collector(PDFConverter):
 
     def __init__(self, rsrcmgr, outfp, codec='utf-8', pageno=1, laparams=None):
@@ -19,18 +92,28 @@ class Collector(PDFConverter):
                               laparams=laparams)
 
         self.layoutmode = 'normal'
+        self.stats = None
+        self.reset()
+
+    def reset(self):
+        """Clears the collected page so the device can be reused."""
         self._yoffset = 50
 
         self._font = None
         self._fontstack = []
 
         self._posstack = []
-        self._texts = []
+        self._spans = TextSpans()
+        self._fragments = None
+
+    def get_spans(self):
+        return self._spans.join()
 
     def place_text(self, color, text, x, y, size):
         color = self.text_colors.get(color)
         if color is not None:
-            self._texts.append(((x, (self._yoffset - y)), text))
+            self._fragments = self._spans.add(x, (self._yoffset - y), 0, 0)
+            self._fragments.append(text)
 
     def begin_div(self, color, borderwidth, x, y, w, h, writing_mode=False):
         self._fontstack.append(self._font)
@@ -45,77 +128,349 @@ class Collector(PDFConverter):
         font = (fontname, fontsize)
         if font != self._font:
             self._font = font
-            self._texts.append((self._posstack[-1], ''))
+            self._fragments = self._spans.add(*self._posstack[-1])
 
-        t = self._texts.pop()
-        self._texts.append((t[0], t[1] + text))
+        self._fragments.append(text)
 
     def put_newline(self):
-        t = self._texts.pop()
-        self._texts.append((t[0], t[1] + '<br>'))
+        self._fragments.append('<br>')
 
     def receive_layout(self, ltpage):
+        if self.stats is None:
+            self._collect(ltpage)
+            return
+
+        with self.stats.stage('collect'):
+            self._collect(ltpage)
+
+    def _collect(self, ltpage):
+        self._render(ltpage)
+
+    def _render(self, item):
         def show_group(item):
             if isinstance(item, LTTextGroup):
                 for child in item:
                     show_group(child)
 
-        def render(item):
-            if isinstance(item, LTPage):
-                self._yoffset += item.y1
-                for child in item:
-                    render(child)
-                if item.groups is not None:
-                    for group in item.groups:
-                        show_group(group)
-            elif isinstance(item, LTCurve):
-                pass
-            elif isinstance(item, LTFigure):
-                self.begin_div('figure', 1, item.x0, item.y1, item.width,
-                               item.height)
-                for child in item:
-                    render(child)
-                self.end_div('figure')
-            elif isinstance(item, LTImage):
-                pass
+        render = self._render
+
+        if isinstance(item, LTPage):
+            self._yoffset += item.y1
+            self._spans.bbox = item.bbox
+            for child in item:
+                render(child)
+            if item.groups is not None:
+                for group in item.groups:
+                    show_group(group)
+        elif isinstance(item, LTCurve):
+            pass
+        elif isinstance(item, LTFigure):
+            self.begin_div('figure', 1, item.x0, item.y1, item.width,
+                           item.height)
+            for child in item:
+                render(child)
+            self.end_div('figure')
+        elif isinstance(item, LTImage):
+            pass
+        else:
+            if self.layoutmode == 'exact':
+                if isinstance(item, LTTextLine):
+                    for child in item:
+                        render(child)
+                elif isinstance(item, LTTextBox):
+                    self.place_text('textbox', str(item.index+1), item.x0,
+                                    item.y1, 20)
+                    for child in item:
+                        render(child)
+                elif isinstance(item, LTChar):
+                    self.place_text('char', item.get_text(), item.x0,
+                                    item.y1, item.size)
             else:
-                if self.layoutmode == 'exact':
-                    if isinstance(item, LTTextLine):
-                        for child in item:
-                            render(child)
-                    elif isinstance(item, LTTextBox):
-                        self.place_text('textbox', str(item.index+1), item.x0,
-                                        item.y1, 20)
-                        for child in item:
-                            render(child)
-                    elif isinstance(item, LTChar):
-                        self.place_text('char', item.get_text(), item.x0,
-                                        item.y1, item.size)
-                else:
-                    if isinstance(item, LTTextLine):
-                        for child in item:
-                            render(child)
-                        if self.layoutmode != 'loose':
-                            self.put_newline()
-                    elif isinstance(item, LTTextBox):
-                        self.begin_div('textbox', 1, item.x0, item.y1,
-                                       item.width, item.height,
-                                       item.get_writing_mode())
-                        for child in item:
-                            render(child)
-                        self.end_div('textbox')
-                    elif isinstance(item, LTChar):
-                        self.put_text(item.get_text(), item.fontname,
-                                      item.size)
-                    elif isinstance(item, LTText):
-                        pass
-
-        render(ltpage)
+                if isinstance(item, LTTextLine):
+                    for child in item:
+                        render(child)
+                    if self.layoutmode != 'loose':
+                        self.put_newline()
+                elif isinstance(item, LTTextBox):
+                    self.begin_div('textbox', 1, item.x0, item.y1,
+                                   item.width, item.height,
+                                   item.get_writing_mode())
+                    for child in item:
+                        render(child)
+                    self.end_div('textbox')
+                elif isinstance(item, LTChar):
+                    self.put_text(item.get_text(), item.fontname,
+                                  item.size)
+                elif isinstance(item, LTText):
+                    pass
 
     def close(self):
         pass
 
 
+class _Line(object):
+    __slots__ = ('chars', 'x0', 'y0', 'x1', 'y1')
+
+    def __init__(self, char):
+        self.chars = [char]
+        self.x0 = char.x0
+        self.y0 = char.y0
+        self.x1 = char.x1
+        self.y1 = char.y1
+
+    def add(self, char):
+        self.chars.append(char)
+        self.x0 = min(self.x0, char.x0)
+        self.y0 = min(self.y0, char.y0)
+        self.x1 = max(self.x1, char.x1)
+        self.y1 = max(self.y1, char.y1)
+
+    def is_empty(self):
+        if self.x1 <= self.x0 or self.y1 <= self.y0:
+            return True
+        return all(not c.get_text().strip() for c in self.chars)
+
+
+class FastCollector(Collector):
+    """Collector that does its own, simpler layout analysis.
+
+    pdfminer's LAParams analysis ends with a hierarchical grouping of the text
+    boxes which the parser never uses. This device receives the bare glyphs
+    and groups them into lines and text boxes with the same rules and
+    margins as the default LAParams, so the spans come out the same.
+    """
+
+    line_overlap = 0.5
+    char_margin = 2.0
+    line_margin = 0.5
+
+    def __init__(self, rsrcmgr, outfp, codec='utf-8', pageno=1):
+        Collector.__init__(self, rsrcmgr, outfp, codec=codec, pageno=pageno,
+                           laparams=None)
+
+    def _collect(self, ltpage):
+        self._yoffset += ltpage.y1
+        self._spans.bbox = ltpage.bbox
+
+        chars = []
+        others = []
+        for item in ltpage:
+            if isinstance(item, LTChar):
+                chars.append(item)
+            else:
+                others.append(item)
+
+        for box in self._group_lines(self._find_lines(chars)):
+            x0 = min(line.x0 for line in box)
+            y0 = min(line.y0 for line in box)
+            x1 = max(line.x1 for line in box)
+            y1 = max(line.y1 for line in box)
+
+            self.begin_div('textbox', 1, x0, y1, x1 - x0, y1 - y0)
+            for line in box:
+                for char in line.chars:
+                    self.put_text(char.get_text(), char.fontname, char.size)
+                self.put_newline()
+            self.end_div('textbox')
+
+        for item in others:
+            self._render(item)
+
+    def _find_lines(self, chars):
+        """Groups consecutive, horizontally aligned glyphs into lines."""
+        lines = []
+        line = None
+        obj0 = None
+        for obj1 in chars:
+            if obj0 is not None:
+                halign = False
+                if obj1.y0 <= obj0.y1 and obj0.y0 <= obj1.y1:
+                    voverlap = min(abs(obj0.y0 - obj1.y1), abs(obj0.y1 - obj1.y0))
+                    if obj1.x0 <= obj0.x1 and obj0.x0 <= obj1.x1:
+                        hdistance = 0
+                    else:
+                        hdistance = min(abs(obj0.x0 - obj1.x1), abs(obj0.x1 - obj1.x0))
+
+                    halign = (min(obj0.height, obj1.height) * self.line_overlap < voverlap
+                              and hdistance < max(obj0.width, obj1.width) * self.char_margin)
+
+                if halign and line is not None:
+                    line.add(obj1)
+                elif line is not None:
+                    lines.append(line)
+                    line = None
+                elif halign:
+                    line = _Line(obj0)
+                    line.add(obj1)
+                else:
+                    lines.append(_Line(obj0))
+            obj0 = obj1
+
+        if line is None and obj0 is not None:
+            line = _Line(obj0)
+        if line is not None:
+            lines.append(line)
+
+        return [line for line in lines if not line.is_empty()]
+
+    def _group_lines(self, lines):
+        """Groups neighbouring lines of the same height into text boxes.
+
+        Two lines are neighbours when they are vertically within
+        line_margin of each other, overlap horizontally and are left, right
+        or centrally aligned. Boxes are the connected groups of neighbours.
+        """
+        if not lines:
+            return []
+
+        parent = list(range(len(lines)))
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        order = sorted(range(len(lines)), key=lambda i: lines[i].y0)
+        y0s = [lines[i].y0 for i in order]
+        maxh = max(line.y1 - line.y0 for line in lines)
+
+        for i, line in enumerate(lines):
+            h = line.y1 - line.y0
+            d = self.line_margin * h
+            cx = line.x0 + line.x1
+
+            lo = bisect_left(y0s, line.y0 - d - maxh)
+            hi = bisect_left(y0s, line.y1 + d)
+            for j in order[lo:hi]:
+                other = lines[j]
+                if (other.x1 <= line.x0 or line.x1 <= other.x0
+                        or other.y1 <= line.y0 - d or line.y1 + d <= other.y0):
+                    continue
+                if abs((other.y1 - other.y0) - h) > d:
+                    continue
+                if (abs(other.x0 - line.x0) <= d
+                        or abs(other.x1 - line.x1) <= d
+                        or abs((other.x0 + other.x1) - cx) / 2 <= d):
+                    parent[find(j)] = find(i)
+
+        boxes = {}
+        for i, line in enumerate(lines):
+            boxes.setdefault(find(i), []).append(line)
+
+        return [sorted(box, key=lambda line: -line.y1) for box in boxes.values()]
+
+
+class DocumentResourceManager(PDFResourceManager):
+    """Resource manager that can be reused for several documents.
+
+    pdfminer caches fonts by their object id, which is only unique within a
+    document. `begin_document` drops the fonts of the previous document.
+    CMaps are cached by pdfminer for the whole process.
+    """
+
+    def __init__(self):
+        PDFResourceManager.__init__(self, caching=True)
+
+    def begin_document(self):
+        self._cached_fonts.clear()
+
+
+class ParsingContext(object):
+    """pdfminer resource manager, device and interpreter shared by pages.
+
+    Creating them for every page means decoding the fonts again for every
+    page. A context keeps one of each, resets the device between pages and
+    can be shared by parsers across many files, but not across threads.
+    """
+
+    def __init__(self, fast=False):
+        self.fast = fast
+        self.resources = DocumentResourceManager()
+        outfp = io.StringIO()
+        if fast:
+            self.device = FastCollector(self.resources, outfp, codec='utf-8')
+        else:
+            laparams = LAParams()
+            self.device = Collector(self.resources, outfp, codec='utf-8', laparams=laparams)
+        self.interpreter = PDFPageInterpreter(self.resources, self.device)
+
+    def begin_document(self):
+        self.resources.begin_document()
+
+    def get_texts(self, page, stats=None):
+        self.device.reset()
+        self.device.stats = stats
+        self.interpreter.process_page(page)
+        return self.device.get_spans()
+
+
+class _Grid(object):
+    """Points bucketed into square cells for nearest neighbour lookups."""
+
+    def __init__(self, size):
+        self.size = size
+        self.cells = defaultdict(list)
+        self.bounds = None
+
+    def add(self, x, y, value):
+        cx = int(x // self.size)
+        cy = int(y // self.size)
+        self.cells[(cx, cy)].append((x, y, value))
+
+        if self.bounds is None:
+            self.bounds = [cx, cy, cx, cy]
+        else:
+            b = self.bounds
+            b[0] = min(b[0], cx)
+            b[1] = min(b[1], cy)
+            b[2] = max(b[2], cx)
+            b[3] = max(b[3], cy)
+
+    def nearest(self, x, y, tolerance=0):
+        """Returns the closest value to the right of or below (x, y).
+
+        Points up to `tolerance` to the left or above still count. Ties are
+        broken by position so the result doesn't depend on insertion order.
+        """
+        if self.bounds is None:
+            return None
+
+        size = self.size
+        cx = int(x // size)
+        cy = int(y // size)
+        x0, y0, x1, y1 = self.bounds
+        rings = max(x1 - cx, y1 - cy, cx - x0, cy - y0, 0) + 1
+
+        best = None
+        for r in range(rings):
+            # every point in ring r is at least (r - 1) cells away
+            if best is not None and best[0] < ((r - 1) * size) ** 2:
+                break
+
+            for i in range(cx - r, cx + r + 1):
+                for j in range(cy - r, cy + r + 1):
+                    if max(abs(i - cx), abs(j - cy)) != r:
+                        continue
+                    # nothing right of or below the point lives there
+                    if i < cx - 1 or j < cy - 1:
+                        continue
+
+                    for px, py, value in self.cells.get((i, j), ()):
+                        if px < x - tolerance or py < y - tolerance:
+                            continue
+                        if px == x and py == y:
+                            continue
+
+                        key = ((px - x) ** 2 + (py - y) ** 2, py, px)
+                        if best is None or key < best[0:3]:
+                            best = key + (value,)
+
+        if best is None:
+            return None
+        return best[3]
+
+
 def parse_number(t):
     return int(re.sub('[^0-9-]', '', t))
 
@@ -150,12 +505,19 @@ def parse_date(t):
     m = months[p[1]]
     y = int(p[2])
     H, M = list(map(int, p[3].split(':')))
-    return datetime(y, m, d, H, M, tzinfo=TZ)
+    # pytz zones need localize, tzinfo=TZ would use the LMT offset +07:07
+    return TZ.localize(datetime(y, m, d, H, M))
 
 class Data(object):
-    def __init__(self, details, transactions):
+    def __init__(self, details, transactions, stats=None):
         self.details = details
         self.transactions = transactions
+        self.stats = stats
+
+    def to_columnar(self):
+        """Returns the transactions as a jenius.transaction.columnar.ColumnarData."""
+        from jenius.transaction.columnar import ColumnarData
+        return ColumnarData.from_data(self)
 
 class Parser(object):
     _table_headers = ['TANGGAL & JAM', 'RINCIAN', 'CATATAN', 'JUMLAH']
@@ -169,35 +531,232 @@ class Parser(object):
         'Nomor Kartu': 'card_number',
     }
 
+    # size of the grid cells used to find the detail values
+    _detail_cell = 64
+
+    # column boundaries learned from earlier pages, shared by all parsers in
+    # the process and keyed by _column_template_key
+    _column_templates = {}
+
+    def __init__(self, fast=False, cache=None, context=None, stats=None):
+        """Creates a parser.
+
+        With `fast`, pages are read with FastCollector instead of running
+        pdfminer's full layout analysis. `cache` is an optional
+        jenius.transaction.cache.ParseCache holding previously parsed
+        statements. `context` is a ParsingContext to share with other
+        parsers, by default the parser creates its own when needed. `stats`
+        is an optional jenius.transaction.stats.ParserStats recording the
+        time spent in every stage.
+        """
+        self.fast = fast
+        self.cache = cache
+        self.stats = stats
+        self._context = context
+
+    def __getstate__(self):
+        # the pdfminer objects can't be pickled, workers make their own
+        state = self.__dict__.copy()
+        state['_context'] = None
+        return state
+
+    @property
+    def context(self):
+        if self._context is None:
+            self._context = ParsingContext(fast=self.fast)
+        return self._context
+
+    def parse(self, f, workers=None):
+        data = self.stream(f, workers=workers)
+        return Data(data.details, list(data.transactions), data.stats)
+
+    def stream(self, f, workers=None, known=None, on_page=None):
+        """Returns a Data whose transactions are produced lazily.
+
+        The first page is processed right away so that the details are
+        available before the transactions are consumed. The remaining pages
+        are only processed as the transactions generator advances.
+
+        `known` turns on incremental parsing. It is called with the details
+        and returns a function telling whether a transaction is already known,
+        or None to read the whole statement. Parsing stops after the first
+        page that only has known transactions, as long as the statement lists
+        the newest transactions first.
+
+        `on_page` is called with the number of pages read so far after every
+        page, e.g. to report progress.
+        """
+        pages = self.iter_pages(f, workers=workers)
+        if on_page is not None:
+            pages = self._counted(pages, on_page)
 
-    def parse(self, f):
         details = None
-        transactions = []
-
-        pages = PDFPage.get_pages(f, caching=False)
-        for i, page in enumerate(pages):
-            d, t = self._process_page(page, find_details=i==0)
+        first = []
+        for d, t in pages:
             details = self._merge_details(details, d)
-            transactions = self._merge_transactions(transactions, t)
+            first = t
+            break
+
+        if known is not None and details is not None:
+            is_known = known(details)
+            if is_known is not None:
+                pages = self._until_known(first, pages, is_known)
+
+        def transactions():
+            yield from first
+            for _, t in pages:
+                yield from t
+
+        return Data(details, transactions(), self.stats)
+
+    def _counted(self, pages, on_page):
+        try:
+            for i, page in enumerate(pages):
+                on_page(i + 1)
+                yield page
+        finally:
+            pages.close()
+
+    def _until_known(self, first, pages, is_known):
+        # newer transactions can only follow known ones when the dates
+        # aren't descending, stopping early is not safe then
+        descending = True
+        last = None
+
+        t = first
+        while True:
+            for tx in t:
+                if last is not None and tx['date'] > last:
+                    descending = False
+                last = tx['date']
+
+            if descending and t and all(is_known(tx) for tx in t):
+                pages.close()
+                return
+
+            try:
+                _, t = next(pages)
+            except StopIteration:
+                return
+
+            yield None, t
+
+    def iter_transactions(self, f, workers=None):
+        for _, transactions in self.iter_pages(f, workers=workers):
+            yield from transactions
+
+    def iter_pages(self, f, workers=None):
+        """Yields a (details, transactions) tuple for every page, in order.
+
+        A statement found in the cache is yielded as a single page.
+        """
+        if self.cache is not None:
+            return self._process_pages_cached(f, workers)
+        if workers is not None and workers > 1:
+            return self._process_pages_parallel(f, workers)
+        return self._process_pages(f)
+
+    def _process_pages_cached(self, f, workers):
+        data = f.read()
+        key = self.cache.key(data, PARSER_VERSION)
+
+        cached = self.cache.get(key)
+        if cached is not None:
+            yield cached
+            return
 
-        return Data(details, transactions)
+        details = None
+        transactions = []
 
-    def _process_page(self, page, find_details=True):
-        texts = sorted(self._get_texts(page), key=cmp_to_key(self._cmp_position))
-        ymin, ymax = self._get_table_boundaries(texts)
-        if ymin == 0:
-            return None, []
+        f = io.BytesIO(data)
+        if workers is not None and workers > 1:
+            pages = self._process_pages_parallel(f, workers)
+        else:
+            pages = self._process_pages(f)
 
-        content = self._find_content(texts, ymin, ymax)
-        cols = self._find_columns(texts, content)
-        rows = self._find_rows(texts, cols)
-        transactions = self._read_transactions(texts, rows)
+        for d, t in pages:
+            details = self._merge_details(details, d)
+            transactions.extend(t)
+            yield d, t
 
-        details = None
-        if find_details:
-            details = self._find_details(texts, ymin)
+        # only reached when all the pages were consumed
+        self.cache.put(key, details, transactions)
 
-        return details, transactions
+    def _process_pages(self, f):
+        self.context.begin_document()
+        pages = PDFPage.get_pages(f, caching=False)
+        for i, page in enumerate(pages):
+            if self.stats is not None:
+                self.stats.page = i
+            yield self._process_page(page, find_details=i==0)
+
+    def _process_pages_parallel(self, f, workers):
+        # pdfminer pages can't be pickled, so every worker opens its own copy
+        # of the document and processes a contiguous range of pages. The
+        # ranges are handed out in order and executor.map keeps that order.
+        data = f.read()
+        count = _count_pages(data)
+        size = max(1, -(-count // (workers * 4)))
+        chunks = [range(start, min(start + size, count))
+                  for start in range(0, count, size)]
+
+        # only keep a few ranges in flight so that the memory use stays
+        # bounded when the consumer is slower than the workers
+        with ProcessPoolExecutor(max_workers=workers,
+                                 initializer=_init_worker,
+                                 initargs=(data,)) as executor:
+            pending = deque()
+            try:
+                for chunk in chunks:
+                    pending.append(executor.submit(_process_page_range, self, chunk))
+                    if len(pending) >= workers * 2:
+                        yield from self._collect_page_range(pending.popleft())
+                while pending:
+                    yield from self._collect_page_range(pending.popleft())
+            finally:
+                # the consumer may stop early, don't wait for unused pages
+                for future in pending:
+                    future.cancel()
+
+    def _collect_page_range(self, future):
+        results, records = future.result()
+        if records:
+            self.stats.extend(records)
+        return results
+
+    def _stage(self, name, spans=None):
+        if self.stats is None:
+            return nullcontext()
+        return self.stats.stage(name, spans=spans)
+
+    def _process_page(self, page, find_details=True):
+        with self._stage('page'):
+            with self._stage('interpret') as stage:
+                texts = self._get_texts(page)
+                if stage is not None:
+                    stage['spans'] = len(texts)
+            with self._stage('sort', spans=len(texts)):
+                texts = texts.sorted()
+            with self._stage('table_boundaries', spans=len(texts)):
+                ymin, ymax = self._get_table_boundaries(texts)
+            if ymin == 0:
+                return None, []
+
+            with self._stage('find_content', spans=len(texts)):
+                content = self._find_content(texts, ymin, ymax)
+            with self._stage('find_columns', spans=len(content)):
+                cols = self._find_columns(texts, content, ymin)
+            with self._stage('find_rows', spans=len(cols)):
+                rows = self._find_rows(texts, cols)
+            with self._stage('read_transactions', spans=len(cols)):
+                transactions = self._read_transactions(texts, rows)
+
+            details = None
+            if find_details:
+                with self._stage('find_details', spans=len(texts)):
+                    details = self._find_details(texts, ymin)
+
+            return details, transactions
 
     def _stripws(self, t):
         return re.sub(r'\s+', ' ', t).strip()
@@ -207,35 +766,26 @@ class Parser(object):
 
 
     def _find_details(self, texts, ymin):
-        headers = []
-        for idx, t in enumerate(texts):
-            x, y, w, h = t[0]
-            if y >= ymin:
-                continue
-
-            tt = t[1]
-            headers.append((idx, (x, y), self._stripws(self._stripbr(tt))))
-
-        def find_value(pos, idx):
-            closest = None
-            for i, p, f in headers:
-                if i == idx:
-                    continue
-
-                dist = (pos[0] - p[0]) ** 2 + (pos[1] - p[1]) ** 2
-
-                if closest is None or dist < closest[0]:
-                    closest = (dist, i, p, f)
-
-            return (closest[1], closest[2], closest[3])
+        # the value of a label is the closest text to its right or below it,
+        # the other texts above the table go into a grid to find it quickly
+        labels = []
+        grid = _Grid(self._detail_cell)
+        for idx in texts.above(ymin):
+            x = texts.xs[idx]
+            y = texts.ys[idx]
+            tt = self._stripws(self._stripbr(texts.texts[idx]))
+            if tt in self._detail_fields:
+                labels.append((idx, x, y, tt))
+            else:
+                grid.add(x, y, (idx, tt))
 
         data = {}
-        for idx, pos, field in headers:
-            if field not in self._detail_fields:
-                continue
-
-            ci, cp, cv = find_value(pos, idx)
-            data[self._detail_fields[field]] = cv
+        for idx, x, y, field in labels:
+            # values on the same line may start slightly higher than the label
+            tolerance = texts.hs[idx]
+            value = grid.nearest(x, y, tolerance)
+            if value is not None:
+                data[self._detail_fields[field]] = value[1]
 
         return data
 
@@ -244,7 +794,7 @@ class Parser(object):
             return re.sub(r'\t', ' ', t)
 
         def values(idxlist):
-            return [texts[idx][1] for idx in idxlist]
+            return [texts.texts[idx] for idx in idxlist]
 
         def get_lines(idxlist):
             lines = []
@@ -296,9 +846,7 @@ class Parser(object):
         for idx, col in cols.items():
             if col != 0:
                 continue
-            x, y, w, h = texts[idx][0]
-            tt = texts[idx][1]
-            col0.append((idx, (y, h)))
+            col0.append((idx, (texts.ys[idx], texts.hs[idx])))
 
         col0 = sorted(col0, key=lambda r: r[1][0])
 
@@ -309,7 +857,7 @@ class Parser(object):
             y, h = pos
             row += 1
 
-            tt = texts[idx][1]
+            tt = texts.texts[idx]
             if row == 1:
                 if not tt.startswith('TANGGAL'): # FIXME self._table_headers[0]):
                     raise Exception('Cannot found "{}"'.format(self._table_headers[0]))
@@ -322,7 +870,7 @@ class Parser(object):
             idx2, _ = col0[row]
             row += 1
 
-            tt2 = texts[idx2][1]
+            tt2 = texts.texts[idx2]
             if not re.search(r'\d\d:\d\d', tt2):
                 raise Exception('could not find time')
 
@@ -351,61 +899,81 @@ class Parser(object):
 
         rows[-1]['height'] = maxh
 
+        # a text belongs to the first row with y - margin <= text y < y +
+        # height. The row ends never decrease, so that row is the first one
+        # ending after the text.
         margin = 2
+        ends = [row['y'] + row['height'] for row in rows]
         for idx, col in cols.items():
-            x, y, w, h = texts[idx][0]
-            tt = texts[idx][1]
-
-            found = False
-            for row in rows:
-                if y >= row['y'] - margin and y < row['y'] + row['height']:
-                    row['cols'][col].append(idx)
-                    found = True
-                    break
+            y = texts.ys[idx]
 
-        def cmp_y(a, b):
-            _, y1, _, _ = texts[a][0]
-            _, y2, _, _ = texts[b][0]
-            return y1 - y2
+            i = bisect_right(ends, y)
+            if i < len(rows) and y >= rows[i]['y'] - margin:
+                rows[i]['cols'][col].append(idx)
 
         for row in rows:
             for i in range(len(row['cols'])):
-                row['cols'][i] = sorted(row['cols'][i], key=cmp_to_key(cmp_y))
+                row['cols'][i] = sorted(row['cols'][i], key=texts.ys.__getitem__)
 
         return rows
 
     def _find_content(self, texts, ymin, ymax):
-        content = []
-        for idx, t in enumerate(texts):
-            x, y, w, h = t[0]
-            if y < ymin:
-                continue
-            if y >= ymax:
-                continue
+        return texts.between(ymin, ymax)
+
+    def _find_columns(self, texts, content, ymin):
+        key = self._column_template_key(texts, ymin)
+        template = self._column_templates.get(key)
+        if template is not None:
+            cols = self._apply_column_template(texts, content, template)
+            if cols is not None:
+                return cols
 
-            content.append(idx)
+        cols, merged = self._merge_columns(texts, content)
+        if len(merged) == len(self._table_headers):
+            self._column_templates[key] = [(x, x + w) for _, (x, y, w, h) in merged]
 
-        return content
+        return cols
+
+    def _column_template_key(self, texts, ymin):
+        headers = []
+        for idx in texts.between(ymin, ymin + 1):
+            s = self._stripws(self._stripbr(texts.texts[idx]))
+            for c in self._table_headers:
+                if s.startswith(c):
+                    headers.append((c, int(texts.xs[idx])))
 
-    def _find_columns(self, texts, content):
-        def cmp_interval(a, b):
-            x, y, w, h = a[1]
-            x2, y2, w2, h2 = b[1]
+        x0, y0, x1, y1 = texts.bbox or (0, 0, 0, 0)
+        return int(x1 - x0), int(y1 - y0), tuple(sorted(headers))
 
-            if x != x2:
-                return x - x2
+    def _apply_column_template(self, texts, content, template):
+        """Assigns the texts to the template columns.
 
-            return (x+w) - (x2+w2)
+        Returns None when a text doesn't fit inside one of the columns.
+        """
+        starts = [x0 for x0, x1 in template]
+
+        cols = {}
+        for idx in content:
+            x = int(texts.xs[idx])
+            i = bisect_right(starts, x) - 1
+            if i < 0 or x + int(texts.ws[idx]) > template[i][1]:
+                return None
+            cols[idx] = i
+
+        return cols
+
+    def _merge_columns(self, texts, content):
+        def interval_key(interval):
+            x, y, w, h = interval[1]
+            return x, x + w
 
         intervals = []
 
         for idx in content:
-            t = texts[idx]
-            x, y, w, h = t[0]
-            tt = t[1]
+            x, y, w, h = texts.position(idx)
             intervals.append((idx, tuple(map(int, [x, y, w, h]))))
 
-        intervals = sorted(intervals, key=cmp_to_key(cmp_interval))
+        intervals = sorted(intervals, key=interval_key)
 
         merged = []
         for interval in intervals:
@@ -422,7 +990,8 @@ class Parser(object):
                 merged.append(([idx], (x, y, w, h)))
                 continue
 
-            merged[-1] = (idx0 + [idx], (x0, y0, max(x0+w0, x+w) - x0, h0))
+            idx0.append(idx)
+            merged[-1] = (idx0, (x0, y0, max(x0+w0, x+w) - x0, h0))
 
         cols = {}
         for i, item in enumerate(merged):
@@ -430,74 +999,67 @@ class Parser(object):
             for idx in idxlist:
                 cols[idx] = i
 
-            for idx in idxlist:
-                tt = texts[idx][1]
-
-            for idx in idxlist:
-                tt = texts[idx][1]
-                x, y, w, h = texts[idx][0]
-
-        return cols
+        return cols, merged
 
     def _get_table_boundaries(self, texts):
+        # the spans are sorted by y, so the first header and the first footer
+        # found are the topmost ones
+        headers = tuple(self._table_headers)
+        footers = tuple(self._footer_markers)
+
         ymin = 0
         ymax = 0
-        for t in texts:
-            x, y, w, h = t[0]
-            s = t[1]
+        for y, s in zip(texts.ys, texts.texts):
             s = re.sub(r'\s+', ' ', s.replace('<br>', '').strip())
-            for c in self._table_headers:
-                if s.startswith(c):
-                    if ymin == 0:
-                        ymin = y
-                    ymin = min(ymin, y)
-
-            for c in self._footer_markers:
-                if s.startswith(c):
-                    if ymax == 0:
-                        ymax = y
-                    ymax = min(ymax, y)
+            if ymin == 0 and s.startswith(headers):
+                ymin = y
+            if ymax == 0 and s.startswith(footers):
+                ymax = y
+            if ymin != 0 and ymax != 0:
+                break
 
         return ymin, ymax
 
-    def _cmp_position(self, a, b):
-        y1 = a[0][1]
-        y2 = b[0][1]
-        if y1 != y2:
-            return y1 - y2
-
-        x1 = a[0][0]
-        x2 = b[0][0]
-        return x1 - x2
-
     def _get_texts(self, page):
-        outfp = io.StringIO()
-
-        res = PDFResourceManager(caching=False)
-        laparams = LAParams()
-        device = Collector(res, outfp, codec='utf-8', laparams=laparams)
-        interpreter = PDFPageInterpreter(res, device)
-        interpreter.process_page(page)
-        device.close()
-
-        return device._texts
+        return self.context.get_texts(page, stats=self.stats)
 
     def _merge_details(self, a, b):
         if a is None:
             return b
         return a
 
-    def _merge_transactions(self, a, b):
-        return a + b
+def _count_pages(data):
+    doc = PDFDocument(PDFParser(io.BytesIO(data)))
+    return sum(1 for _ in PDFPage.create_pages(doc))
+
+_worker_data = None
+_worker_contexts = {}
+
+def _init_worker(data):
+    global _worker_data
+    _worker_data = data
+
+def _process_page_range(parser, pagenos):
+    # the parser arrives without a context, reuse the one of this process
+    if parser.fast not in _worker_contexts:
+        _worker_contexts[parser.fast] = ParsingContext(fast=parser.fast)
+    parser._context = _worker_contexts[parser.fast]
+    parser.context.begin_document()
+
+    results = []
+    f = io.BytesIO(_worker_data)
+    pages = PDFPage.get_pages(f, pagenos=set(pagenos), caching=False)
+    for i, page in zip(pagenos, pages):
+        if parser.stats is not None:
+            parser.stats.page = i
+        results.append(parser._process_page(page, find_details=i==0))
+
+    records = None
+    if parser.stats is not None:
+        records = parser.stats.records
+    return results, records
 
 if __name__ == '__main__':
     import sys
-    from pprint import pprint
-
-    inp = sys.argv[1]
-    with open(inp, 'rb') as f:
-        p = Parser()
-        data = p.parse(f)
-        pprint(data.details)
-        pprint(data.transactions)
-
+    from jenius.transaction.cli import main
+    sys.exit(main())
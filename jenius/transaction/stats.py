@@ -0,0 +1,141 @@
+import sys
+import time
+import tracemalloc
+from collections import namedtuple
+from contextlib import ExitStack, contextmanager
+
+StageRecord = namedtuple('StageRecord', ['stage', 'page', 'wall', 'cpu', 'spans', 'peak', 'statement'],
+                         defaults=[None])
+StageRecord.__doc__ = """Time spent in one parser stage for one page.
+
+`page` is None for stages that are not tied to a page, `spans` is the number
+of text spans the stage worked on, and `peak` the peak of the memory allocated
+during the stage in bytes, only measured with ParserStats(memory=True).
+`statement` names the statement the page belongs to, e.g. its path, when
+the stats cover several of them.
+"""
+
+class ParserStats(object):
+    """Collects the time spent in every parser stage, per page.
+
+    `hooks` are called with every StageRecord as it is added, for example to
+    export the numbers. `wrappers` are called with the stage name and the page
+    and return a context manager entered around the stage, for tracing.
+    Stages run in worker processes only reach the hooks once their results
+    are collected, the wrappers are not used there. `statement` is recorded
+    with the stages, set it before parsing every statement.
+    """
+
+    def __init__(self, memory=False, hooks=None, wrappers=None, statement=None):
+        self.memory = memory
+        self.statement = statement
+        self.hooks = list(hooks or [])
+        self.wrappers = list(wrappers or [])
+        self.records = []
+        self.page = None
+        self._peaks = []
+
+    def __getstate__(self):
+        # hooks are often closures, they stay in the parent process
+        state = self.__dict__.copy()
+        state['hooks'] = []
+        state['wrappers'] = []
+        state['records'] = []
+        state['_peaks'] = []
+        return state
+
+    def add(self, record):
+        self.records.append(record)
+        for hook in self.hooks:
+            hook(record)
+
+    def extend(self, records):
+        for record in records:
+            self.add(record)
+
+    @contextmanager
+    def stage(self, name, spans=None):
+        """Measures the code run inside the block as stage `name`.
+
+        Stages can be nested, the outer stage includes the inner ones. The
+        block receives a dict whose 'spans' can be set when the count is only
+        known at the end.
+        """
+        page = self.page
+        with ExitStack() as stack:
+            for wrapper in self.wrappers:
+                stack.enter_context(wrapper(name, page))
+
+            if self.memory:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                start_mem = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+                self._peaks.append(start_mem)
+
+            info = dict(spans=spans)
+            wall = time.perf_counter()
+            cpu = time.process_time()
+            try:
+                yield info
+            finally:
+                wall = time.perf_counter() - wall
+                cpu = time.process_time() - cpu
+
+                peak = None
+                if self.memory:
+                    # inner stages reset the peak, they leave theirs behind
+                    absolute = max(tracemalloc.get_traced_memory()[1], self._peaks.pop())
+                    peak = absolute - start_mem
+                    if self._peaks:
+                        self._peaks[-1] = max(self._peaks[-1], absolute)
+
+                self.add(StageRecord(name, page, wall, cpu, info['spans'], peak, self.statement))
+
+    def summary(self):
+        """Returns a dict of stage name to its totals over all pages."""
+        stages = {}
+        for r in self.records:
+            s = stages.get(r.stage)
+            if s is None:
+                s = stages[r.stage] = dict(calls=0, wall=0.0, cpu=0.0, spans=0, peak=None)
+            s['calls'] += 1
+            s['wall'] += r.wall
+            s['cpu'] += r.cpu
+            s['spans'] += r.spans or 0
+            if r.peak is not None:
+                s['peak'] = max(s['peak'] or 0, r.peak)
+        return stages
+
+    def pages(self):
+        """Returns a dict of (statement, page number) to the wall time of every stage."""
+        pages = {}
+        for r in self.records:
+            if r.page is None:
+                continue
+            stages = pages.setdefault((r.statement, r.page), {})
+            stages[r.stage] = stages.get(r.stage, 0.0) + r.wall
+        return pages
+
+    def report(self, out=sys.stderr, slowest=5):
+        summary = self.summary()
+
+        out.write('{:<20} {:>7} {:>10} {:>10} {:>9} {:>11}\n'.format(
+            'stage', 'calls', 'wall', 'cpu', 'spans', 'peak KiB'))
+        for name, s in summary.items():
+            peak = '-' if s['peak'] is None else '{:.1f}'.format(s['peak'] / 1024)
+            out.write('{:<20} {:>7} {:>10.4f} {:>10.4f} {:>9} {:>11}\n'.format(
+                name, s['calls'], s['wall'], s['cpu'], s['spans'], peak))
+
+        pages = self.pages()
+        if not pages or not slowest:
+            return
+
+        out.write('\nslowest pages\n')
+        totals = sorted(pages.items(), key=lambda p: -p[1].get('page', 0.0))
+        for (statement, page), stages in totals[:slowest]:
+            parts = ' '.join('{}={:.4f}'.format(name, wall) for name, wall in stages.items())
+            name = 'page {:<5}'.format(page + 1)
+            if statement is not None:
+                name = '{} {}'.format(statement, name)
+            out.write('{} {}\n'.format(name, parts))
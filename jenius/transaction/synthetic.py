@@ -0,0 +1,276 @@
+"""Synthetic Jenius statement generator.
+
+Writes minimal PDF files laid out like the real statements so the parser can
+be exercised and benchmarked without real bank data. Only the standard
+Helvetica fonts are used, so no dependencies beyond the standard library are
+needed.
+"""
+
+import io
+import random
+from datetime import datetime, timedelta
+
+from jenius.transaction.parser import TZ, Parser
+
+PAGE_WIDTH = 595
+PAGE_HEIGHT = 842
+
+MONTHS = ['Jan', 'Feb', 'Mar', 'Apr', 'Mei', 'Jun', 'Jul', 'Agt', 'Sep', 'Okt', 'Nov', 'Des']
+
+COLUMNS = [40, 130, 300, 430]
+ROW_GAP = 14
+LINE_HEIGHT = 10
+TABLE_FONT_SIZE = 8
+RATE_FONT_SIZE = 6
+
+MERCHANTS = [
+    'Kopi Kenangan', 'GoPay Top Up', 'Tokopedia', 'Indomaret Kemang',
+    'Grab Indonesia', 'Transfer ke BCA', 'Netflix.com', 'Steam Games',
+    'PLN Prabayar', 'Alfamart Senopati', 'Starbucks Plaza Senayan',
+]
+CATEGORIES = ['Makanan & Minuman', 'Belanja', 'Transportasi', 'Tagihan', 'Hiburan', 'Transfer']
+TYPES = ['Pembayaran', 'Transfer Keluar', 'Transfer Masuk', 'Top Up']
+NOTES = ['makan siang', 'bayar kos', 'langganan', 'patungan', 'hadiah']
+CURRENCIES = [('USD', 14500), ('SGD', 10800), ('JPY', 135)]
+
+
+def _escape(t):
+    return t.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def _format_amount(n):
+    sign = '-' if n < 0 else '+'
+    return '{}Rp {:,}'.format(sign, abs(n)).replace(',', '.')
+
+
+def _format_date(d):
+    return '{} {} {}'.format(d.day, MONTHS[d.month - 1], d.year)
+
+
+def make_transactions(count, seed=0, start=None):
+    """Returns `count` random transactions, newest first."""
+    rnd = random.Random(str(seed))
+    ts = start or datetime(2020, 9, 30, 23, 0)
+    transactions = []
+    for i in range(count):
+        ts = ts - timedelta(minutes=rnd.randint(30, 60 * 24))
+        amount = rnd.randint(1, 2000) * 500
+        tx_type = rnd.choice(TYPES)
+        if tx_type != 'Transfer Masuk':
+            amount = -amount
+
+        tx = dict(
+            date=TZ.localize(ts),
+            description=rnd.choice(MERCHANTS),
+            reference=None,
+            id='{:012d}'.format(rnd.randrange(10 ** 12)),
+            category=rnd.choice(CATEGORIES),
+            type=tx_type,
+            note=None,
+            amount=amount,
+            currency='IDR',
+            transaction_currency='IDR',
+            rate=1,
+        )
+        if rnd.random() < 0.3:
+            tx['reference'] = 'Ref {:08d}'.format(rnd.randrange(10 ** 8))
+        if rnd.random() < 0.3:
+            tx['note'] = rnd.choice(NOTES)
+        if rnd.random() < 0.1:
+            curr, rate = rnd.choice(CURRENCIES)
+            tx['transaction_currency'] = curr
+            tx['rate'] = rate
+        transactions.append(tx)
+
+    return transactions
+
+
+class _Page(object):
+    def __init__(self):
+        self._ops = []
+
+    def text(self, x, y, t, size=TABLE_FONT_SIZE, font='F1'):
+        self._ops.append('BT /{} {} Tf 1 0 0 1 {:.2f} {:.2f} Tm ({}) Tj ET'.format(
+            font, size, x, y, _escape(t)))
+
+    def content(self):
+        return '\n'.join(self._ops).encode('latin-1')
+
+
+def _cells(tx):
+    tanggal = [_format_date(tx['date']), tx['date'].strftime('%H:%M')]
+
+    rincian = [tx['description']]
+    if tx['reference'] is not None:
+        rincian.append(tx['reference'])
+    rincian.append('{} | {}'.format(tx['id'], tx['category']))
+
+    catatan = [tx['type']]
+    if tx['note'] is not None:
+        catatan.insert(0, tx['note'])
+
+    jumlah = [(_format_amount(tx['amount']), TABLE_FONT_SIZE)]
+    if tx['transaction_currency'] != tx['currency']:
+        line = 'Transaksi dengan {0} (1 {0} = {1} {2})'.format(
+            tx['transaction_currency'], '{:,}'.format(tx['rate']).replace(',', '.'), tx['currency'])
+        jumlah.append((line, RATE_FONT_SIZE))
+
+    return tanggal, rincian, catatan, jumlah
+
+
+def _row_height(tx):
+    return max(len(c) for c in _cells(tx)) * LINE_HEIGHT
+
+
+def _draw_row(page, y, tx):
+    tanggal, rincian, catatan, jumlah = _cells(tx)
+    for col, lines in ((0, tanggal), (1, rincian), (2, catatan)):
+        for i, line in enumerate(lines):
+            page.text(COLUMNS[col], y - i * LINE_HEIGHT, line)
+    for i, (line, size) in enumerate(jumlah):
+        page.text(COLUMNS[3], y - i * LINE_HEIGHT, line, size=size)
+
+
+def _draw_details(page, details):
+    page.text(40, 790, 'Riwayat Transaksi', size=16, font='F2')
+    for i, (label, field) in enumerate(Parser._detail_fields.items()):
+        x = 40 + (i % 2) * 260
+        y = 750 - (i // 2) * 40
+        page.text(x, y, label, size=8, font='F2')
+        page.text(x, y - 16, details[field], size=9)
+
+
+def _draw_header(page, y):
+    for x, label in zip(COLUMNS, Parser._table_headers):
+        page.text(x, y, label, size=TABLE_FONT_SIZE, font='F2')
+
+
+def _draw_footer(page):
+    page.text(40, 50, 'PT Bank BTPN Tbk terdaftar dan diawasi oleh Otoritas Jasa Keuangan', size=6)
+    page.text(40, 40, 'www.jenius.com', size=6)
+    page.text(300, 40, 'Jenius Help 1500 365', size=6)
+
+
+DETAILS = dict(
+    name='BUDI SANTOSO',
+    account_number='90012345678',
+    cashtag='$budisantoso',
+    currency='IDR',
+    account='Flexi Saver',
+    card_number='5 0 3 1 2 3 4 5 6 7 8 9 0 1 2 3',
+)
+
+
+def layout(transactions, details=DETAILS, pages=None):
+    """Lays out the transactions, returns the pages and the ones placed.
+
+    Without `pages` every transaction is placed. Otherwise exactly that many
+    pages are filled and the remaining transactions are left out.
+    """
+    remaining = iter(transactions)
+    result = []
+    placed = []
+    tx = next(remaining, None)
+    while not result or (tx is not None and (pages is None or len(result) < pages)):
+        page = _Page()
+        if not result:
+            _draw_details(page, details)
+            y = 640
+        else:
+            y = 790
+        _draw_header(page, y)
+        _draw_footer(page)
+        y -= 20
+
+        count = 0
+        while tx is not None:
+            h = _row_height(tx)
+            # keep at least two rows on a page, the parser needs them to
+            # find the row height
+            if y - h < 70 and count >= 2:
+                break
+            _draw_row(page, y, tx)
+            placed.append(tx)
+            y -= h + ROW_GAP
+            count += 1
+            tx = next(remaining, None)
+
+        result.append(page)
+
+    return result, placed
+
+
+def _iter_transactions(seed):
+    start = None
+    batch = 0
+    while True:
+        transactions = make_transactions(100, seed=(seed, batch), start=start)
+        yield from transactions
+        start = transactions[-1]['date'].replace(tzinfo=None)
+        batch += 1
+
+
+def generate(fp, pages=1, seed=0, details=DETAILS):
+    """Writes a statement with the given number of pages to `fp`.
+
+    Returns the details and transactions the parser is expected to read.
+    """
+    result, placed = layout(_iter_transactions(seed), details=details, pages=pages)
+    write_pdf(fp, result)
+    return dict(details), placed
+
+
+def write_pdf(fp, pages):
+    objects = []
+
+    def add(body):
+        objects.append(body)
+        return len(objects)
+
+    catalog = add(None)
+    pages_id = add(None)
+    f1 = add(b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>')
+    f2 = add(b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>')
+
+    kids = []
+    for page in pages:
+        content = page.content()
+        cid = add(b'<< /Length %d >>\nstream\n' % len(content) + content + b'\nendstream')
+        kids.append(add((
+            '<< /Type /Page /Parent {} 0 R /MediaBox [0 0 {} {}] '
+            '/Resources << /Font << /F1 {} 0 R /F2 {} 0 R >> >> /Contents {} 0 R >>'
+        ).format(pages_id, PAGE_WIDTH, PAGE_HEIGHT, f1, f2, cid).encode('latin-1')))
+
+    objects[catalog - 1] = '<< /Type /Catalog /Pages {} 0 R >>'.format(pages_id).encode('latin-1')
+    objects[pages_id - 1] = '<< /Type /Pages /Kids [{}] /Count {} >>'.format(
+        ' '.join('{} 0 R'.format(k) for k in kids), len(kids)).encode('latin-1')
+
+    out = io.BytesIO()
+    out.write(b'%PDF-1.4\n')
+    offsets = []
+    for i, body in enumerate(objects):
+        offsets.append(out.tell())
+        out.write(b'%d 0 obj\n' % (i + 1) + body + b'\nendobj\n')
+
+    xref = out.tell()
+    out.write(b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1))
+    for off in offsets:
+        out.write(b'%010d 00000 n \n' % off)
+    out.write(b'trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (
+        len(objects) + 1, catalog, xref))
+
+    fp.write(out.getvalue())
+
+
+if __name__ == '__main__':
+    import argparse
+
+    ap = argparse.ArgumentParser(description='Writes a synthetic Jenius statement.')
+    ap.add_argument('output')
+    ap.add_argument('--pages', type=int, default=1)
+    ap.add_argument('--seed', type=int, default=0)
+    args = ap.parse_args()
+
+    with open(args.output, 'wb') as f:
+        details, transactions = generate(f, pages=args.pages, seed=args.seed)
+    print('{} pages, {} transactions'.format(args.pages, len(transactions)))
@@ -0,0 +1,88 @@
+import io
+import random
+import unittest
+
+from jenius.transaction import synthetic
+from jenius.transaction.parser import Parser, _Grid
+from jenius.transaction.stats import ParserStats
+
+def statement(pages, seed=0):
+    f = io.BytesIO()
+    details, transactions = synthetic.generate(f, pages=pages, seed=seed)
+    return f.getvalue(), details, transactions
+
+class ParserTest(unittest.TestCase):
+    def test_modes_give_equal_output(self):
+        for seed in range(2):
+            data, details, transactions = statement(3, seed=seed)
+            for options in [dict(), dict(fast=True), dict(workers=2), dict(fast=True, workers=2)]:
+                with self.subTest(seed=seed, **options):
+                    workers = options.pop('workers', None)
+                    result = Parser(**options).parse(io.BytesIO(data), workers=workers)
+                    self.assertEqual(result.details, details)
+                    self.assertEqual(result.transactions, transactions)
+
+    def test_details(self):
+        data, details, _ = statement(1)
+        result = Parser(fast=True).parse(io.BytesIO(data))
+        for name in ['name', 'account_number', 'currency', 'cashtag', 'account', 'card_number']:
+            self.assertEqual(result.details[name], details[name])
+
+    def test_column_templates(self):
+        Parser._column_templates.clear()
+        parser = Parser(fast=True)
+        for seed in range(2):
+            data, details, transactions = statement(2, seed=seed)
+            result = parser.parse(io.BytesIO(data))
+            self.assertEqual(result.transactions, transactions)
+            # learned on the first page, reused after
+            self.assertTrue(Parser._column_templates)
+
+    def test_incremental_stops_on_known_page(self):
+        data, details, transactions = statement(3)
+        pages = [t for _, t in Parser(fast=True).iter_pages(io.BytesIO(data))]
+        self.assertEqual(len(pages), 3)
+
+        known = set(tx['id'] for tx in pages[1])
+        result = Parser(fast=True).stream(io.BytesIO(data), known=lambda d: lambda tx: tx['id'] in known)
+        self.assertEqual(list(result.transactions), pages[0] + pages[1])
+
+        result = Parser(fast=True).stream(io.BytesIO(data), known=lambda d: None)
+        self.assertEqual(list(result.transactions), transactions)
+
+    def test_on_page(self):
+        data, _, _ = statement(3)
+        for workers in [None, 2]:
+            pages = []
+            result = Parser(fast=True).stream(io.BytesIO(data), workers=workers, on_page=pages.append)
+            list(result.transactions)
+            self.assertEqual(pages, [1, 2, 3])
+
+class ParserStatsTest(unittest.TestCase):
+    def test_pages_of_several_statements(self):
+        stats = ParserStats()
+        for name in ['a.pdf', 'b.pdf']:
+            data, _, _ = statement(2)
+            stats.statement = name
+            Parser(fast=True, stats=stats).parse(io.BytesIO(data))
+
+        self.assertEqual(sorted(stats.pages()), [('a.pdf', 0), ('a.pdf', 1), ('b.pdf', 0), ('b.pdf', 1)])
+
+class GridTest(unittest.TestCase):
+    def test_nearest(self):
+        rnd = random.Random(0)
+        points = [(rnd.uniform(0, 500), rnd.uniform(0, 800)) for _ in range(300)]
+        grid = _Grid(40)
+        for i, (x, y) in enumerate(points):
+            grid.add(x, y, i)
+
+        for _ in range(200):
+            x, y = rnd.uniform(-50, 550), rnd.uniform(-50, 850)
+            tolerance = rnd.choice([0, 5])
+            candidates = [((px - x) ** 2 + (py - y) ** 2, py, px, i) for i, (px, py) in enumerate(points)
+                          if px >= x - tolerance and py >= y - tolerance]
+            expected = min(candidates)[3] if candidates else None
+            self.assertEqual(grid.nearest(x, y, tolerance=tolerance), expected)
+
+if __name__ == '__main__':
+    unittest.main()